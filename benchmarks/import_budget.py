@@ -0,0 +1,72 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+DEFAULT_BUDGET_MS = 15.0
+
+# Modules that only specific commands need and must not load at startup
+DEFERRED_MODULES = [
+    'bs4',
+    'concurrent.futures',
+    'curses',
+    'requests',
+    'socket',
+    'sqlite3',
+    'subprocess',
+    'urllib3',
+    'webbrowser',
+]
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)')
+
+def measure_import():
+    # -X importtime reports microseconds; the cumulative time of the
+    # ojcli entry covers everything imported while loading the module
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ojcli'],
+                            cwd=REPO, capture_output=True, text=True, check=True)
+    cumulative = None
+    modules = set()
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        modules.add(match.group(3))
+        if match.group(3) == 'ojcli':
+            cumulative = int(match.group(2)) / 1000.0
+    return cumulative, modules
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the cold import time of ojcli against a budget')
+    parser.add_argument('-b', '--budget', type=float, default=DEFAULT_BUDGET_MS,
+        help=f'Allowed import time in milliseconds. Default is {DEFAULT_BUDGET_MS:g}.')
+    parser.add_argument('-r', '--runs', type=int, default=5,
+        help='Number of runs, the fastest one is compared to the budget. Default is 5.')
+    args = parser.parse_args()
+
+    timings = list()
+    loaded = set()
+    for _ in range(args.runs):
+        cumulative, modules = measure_import()
+        timings.append(cumulative)
+        loaded |= modules
+
+    failed = False
+    best = min(timings)
+    print(f'ojcli import: {best:.2f} ms (budget {args.budget:g} ms)')
+    if best > args.budget:
+        print('FAIL: import time is over budget')
+        failed = True
+
+    eager = [m for m in DEFERRED_MODULES if m in loaded]
+    if eager:
+        print('FAIL: imported at startup: ' + ', '.join(eager))
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from uhunt_server import USERNAME, start_server_process
+
+OJCLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ojcli.py')
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+TEAM_SIZE = 50
+
+# name, arguments, stdin
+COMMANDS = [
+    ('verdict', ['verdict'], ''),
+    ('verdict-all', ['verdict', '--all'], ''),
+    ('verdict-all-ndjson', ['--format', 'ndjson', 'verdict', '--all'], ''),
+    ('rank', ['rank', '-C', '5', '-n', '5'], ''),
+    ('rank-wide', ['rank', '-C', '5000'], ''),
+    ('rank-since', ['rank', '--since', '7d'], ''),
+    ('random', ['random'], 'n\n'),
+    ('random-unsolved', ['random', '--unsolved'], 'n\n'),
+    ('open-prefetch', ['open', '--no-browser', '100', '--prefetch', '5'], ''),
+    ('progress', ['progress'], ''),
+    ('stats', ['stats'], ''),
+    ('progress-team', ['progress', '--users', 'team.txt'], ''),
+    ('stats-team', ['stats', '--users', 'team.txt'], ''),
+    ('search', ['search', 'knight', 'tree'], ''),
+    ('submit', ['submit', '-p', '100', 'solution.cpp'], 'y\n'),
+]
+
+METRICS = ['wall_ms', 'requests', 'bytes', 'peak_rss_kb']
+
+# ------------------------------------------------------------------------
+# Running commands
+# ------------------------------------------------------------------------
+def make_home(root):
+    home = os.path.join(root, 'home')
+    os.makedirs(home)
+    with open(os.path.join(home, '.ojrc'), 'w') as f:
+        # Team fetches are not throttled so the numbers show the client's own cost
+        f.write(f'[user]\nusername = {USERNAME}\npassword = bench\n[team]\nrate_limit = 0\n')
+    with open(os.path.join(home, 'solution.cpp'), 'w') as f:
+        f.write('int main() { return 0; }\n')
+    with open(os.path.join(home, 'team.txt'), 'w') as f:
+        f.write(USERNAME + '\n' + ''.join(f'user{i}\n' for i in range(1, TEAM_SIZE)))
+    return home
+
+def control(server_url, action):
+    with urllib.request.urlopen(f'{server_url}/__bench__/{action}') as response:
+        return json.load(response)
+
+def run_command(server_url, env, cwd, args, stdin):
+    control(server_url, 'reset')
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, OJCLI] + args, cwd=cwd, env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE)
+    proc.stdin.write(stdin.encode())
+    proc.stdin.close()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    stderr = proc.stderr.read().decode(errors='replace')
+    proc.stderr.close()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    counters = control(server_url, 'stats')
+    return {'wall_ms': round(wall * 1000, 1),
+            'requests': counters['requests'],
+            'bytes': counters['bytes'],
+            'peak_rss_kb': rusage.ru_maxrss,
+            'status': proc.returncode,
+            'stderr': stderr.strip().splitlines()[-1:]}
+
+def run_suite(sizes, commands, fixtures=None):
+    server, server_url = start_server_process(fixtures=fixtures)
+    results = dict()
+    try:
+        for size in sizes:
+            control(server_url, f'history/{size}')
+            root = tempfile.mkdtemp(prefix='ojcli-bench-')
+            try:
+                home = make_home(root)
+                env = dict(os.environ,
+                           HOME=home,
+                           XDG_CACHE_HOME=os.path.join(root, 'cache'),
+                           OJCLI_BASE_URL=f'{server_url}/api',
+                           OJCLI_JUDGE_URL=server_url)
+                env.pop('PAGER', None)
+                for name, args, stdin in commands:
+                    # The first run starts from the cache left by the previous
+                    # commands, the second one shows the fully warm cost
+                    for phase in ('first', 'warm'):
+                        key = f'{size}/{name}/{phase}'
+                        results[key] = run_command(server_url, env, home, args, stdin)
+                        print_result(key, results[key])
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+    finally:
+        server.terminate()
+        server.join()
+    return results
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Reporting
+# ------------------------------------------------------------------------
+def print_header():
+    print('%-34s %10s %9s %12s %12s %7s' % ('COMMAND', 'WALL MS', 'REQUESTS', 'BYTES', 'PEAK RSS KB', 'STATUS'))
+
+def print_result(key, result):
+    print('%-34s %10.1f %9d %12d %12d %7d' % (key, result['wall_ms'], result['requests'],
+                                              result['bytes'], result['peak_rss_kb'], result['status']))
+    if result['status'] != 0 and result['stderr']:
+        print('    ' + result['stderr'][0])
+
+def compare(baseline, results, tolerance):
+    regressions = list()
+    print('\n%-34s %-12s %12s %12s %8s' % ('COMMAND', 'METRIC', 'BASELINE', 'CURRENT', 'CHANGE'))
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        for metric in METRICS:
+            old = baseline[key][metric]
+            new = results[key][metric]
+            change = (new - old) / old if old else (0.0 if new == old else float('inf'))
+            flag = ''
+            # Request and byte counts are deterministic, timings get some slack
+            limit = tolerance if metric in ('wall_ms', 'peak_rss_kb') else 0.0
+            if change > limit:
+                flag = ' !'
+                regressions.append((key, metric))
+            print('%-34s %-12s %12s %12s %+7.0f%%%s' % (key, metric, old, new, change * 100, flag))
+    return regressions
+# ------------------------------------------------------------------------
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ojcli commands against a local uHunt stand-in')
+    parser.add_argument('-s', '--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+        help='Comma separated submission history sizes')
+    parser.add_argument('-c', '--commands',
+        help='Comma separated subset of commands to run')
+    parser.add_argument('-f', '--fixtures',
+        help='Directory with recorded p.json, subs-user.json and ranklist.json')
+    parser.add_argument('--save', metavar='FILE',
+        help='Store the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE',
+        help='Diff the results against a stored baseline and fail on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+        help='Allowed relative slowdown for timings and memory. Default is 0.25.')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    commands = COMMANDS
+    if args.commands:
+        wanted = args.commands.split(',')
+        commands = [c for c in COMMANDS if c[0] in wanted]
+
+    print_header()
+    results = run_suite(sizes, commands, fixtures=args.fixtures)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.tolerance):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
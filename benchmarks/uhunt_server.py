@@ -0,0 +1,278 @@
+import argparse
+import gzip
+import hashlib
+import http.server
+import json
+import multiprocessing
+import os
+import random
+import re
+import threading
+import urllib.parse
+
+USER_ID = 5
+USERNAME = 'bench'
+# Team members are named user<N> and get user id TEAM_UID_BASE + N
+TEAM_UID_BASE = 100000
+TEAM_HISTORY_SIZE = 500
+
+LOGIN_FORM = '''\
+<html><body>
+<form id="mod_loginform" method="post" action="/index.php?option=com_comprofiler&amp;task=login">
+<input type="hidden" name="op2" value="login" />
+<input type="hidden" name="lang" value="english" />
+<input type="hidden" name="force_session" value="1" />
+<input type="hidden" name="return" value="B:aHR0cHM6Ly9vbmxpbmVqdWRnZS5vcmcv" />
+<input type="hidden" name="message" value="0" />
+<input type="hidden" name="loginfrom" value="loginmodule" />
+<input type="hidden" name="cbsecuritym3" value="cbm_00000000_00000000_00000000" />
+<input type="hidden" name="j00000000000000000000000000000000" value="1" />
+</form>
+</body></html>'''
+
+LOGGED_IN_PAGE = '<html><body><a href="/logout">Logout</a></body></html>'
+SUBMITTED_PAGE = '<html><body>Submission received with ID 1<br />Logout</body></html>'
+
+# ------------------------------------------------------------------------
+# Recorded or synthetic uHunt data
+# ------------------------------------------------------------------------
+def make_catalog(size=5000, seed=1):
+    rng = random.Random(seed)
+    words = ['Tree', 'Graph', 'Path', 'Sum', 'String', 'Game', 'Prime', 'Matrix',
+             'Robot', 'Island', 'Bridge', 'Knight', 'Queen', 'Puzzle', 'Counting']
+    rows = list()
+    for i in range(size):
+        num = 100 + i if i < 1700 else 10000 + (i - 1700)
+        title = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        rows.append([i + 1, num, title] + [0] * 19)
+    return rows
+
+def make_history(catalog, size, seed=2):
+    rng = random.Random(seed)
+    verdicts = [90, 90, 90, 70, 70, 50, 40, 30, 80]
+    start = 1262304000
+    subs = list()
+    for sid in range(1, size + 1):
+        pid = rng.choice(catalog)[0]
+        subs.append([sid, pid, rng.choice(verdicts), rng.randint(0, 3000),
+                     start + sid * 600, rng.randint(1, 6), rng.choice([-1, rng.randint(1, 5000)])])
+    return subs
+
+def make_ranklist(size=20000, seed=3):
+    rng = random.Random(seed)
+    ranks = list()
+    ac = size * 2
+    for rank in range(1, size + 1):
+        userid = USER_ID if rank == size // 2 else 100000 + rank
+        username = USERNAME if userid == USER_ID else f'user{rank}'
+        ac -= rng.randint(0, 3)
+        ranks.append({'rank': rank, 'old': 0, 'userid': userid, 'name': username.title(),
+                      'username': username, 'ac': max(ac, 0), 'nos': max(ac, 0) * 2,
+                      'activity': [0, 0, 0, 0, 0]})
+    return ranks
+
+def load_fixture(directory, name, default):
+    if directory:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+    return default()
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Stand-in server
+# ------------------------------------------------------------------------
+class UHuntState:
+    def __init__(self, fixtures=None, history_size=1000):
+        self.catalog = load_fixture(fixtures, 'p.json', make_catalog)
+        self.ranklist = load_fixture(fixtures, 'ranklist.json', make_ranklist)
+        self.fixtures = fixtures
+        self.member_subs = dict()
+        self.lock = threading.Lock()
+        self.set_history_size(history_size)
+        self.reset_counters()
+
+    def set_history_size(self, size):
+        history = load_fixture(self.fixtures, 'subs-user.json',
+                               lambda: {'subs': make_history(self.catalog, size)})
+        self.subs = sorted(history['subs'], key=lambda s: s[0])[:size]
+
+    def member_history(self, uid):
+        with self.lock:
+            if uid not in self.member_subs:
+                self.member_subs[uid] = make_history(self.catalog, TEAM_HISTORY_SIZE, seed=uid)
+            return self.member_subs[uid]
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.paths = list()
+
+    def count(self, path, nbytes):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += nbytes
+            self.paths.append(path)
+
+    def counters(self):
+        with self.lock:
+            return {'requests': self.requests, 'bytes': self.bytes_sent, 'paths': list(self.paths)}
+
+class UHuntHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def send_body(self, body, content_type='application/json', status=200, headers=None, counted=True):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        extra = dict(headers or {})
+        if 'gzip' in self.headers.get('Accept-Encoding', '') and len(body) > 512:
+            body = gzip.compress(body, compresslevel=5)
+            extra['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in extra.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        if counted:
+            self.state.count(self.path, len(body))
+
+    def send_json(self, data, headers=None):
+        self.send_body(json.dumps(data), headers=headers)
+
+    def send_not_modified(self, etag):
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        self.state.count(self.path, 0)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path
+        query = urllib.parse.parse_qs(url.query)
+        state = self.state
+
+        # Control endpoints for the benchmark harness, not counted
+        if path == '/__bench__/stats':
+            return self.send_body(json.dumps(state.counters()), counted=False)
+        if path == '/__bench__/reset':
+            state.reset_counters()
+            return self.send_body('{}', counted=False)
+        match = re.fullmatch(r'/__bench__/history/(\d+)', path)
+        if match:
+            state.set_history_size(int(match.group(1)))
+            return self.send_body('{}', counted=False)
+
+        if path == '/api/p':
+            body = json.dumps(state.catalog)
+            etag = '"%s"' % hashlib.sha1(body.encode('utf-8')).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                return self.send_not_modified(etag)
+            return self.send_body(body, headers={'ETag': etag})
+
+        match = re.fullmatch(r'/api/p/num/(\d+)', path)
+        if match:
+            num = int(match.group(1))
+            row = next((r for r in state.catalog if r[1] == num), None)
+            return self.send_json({'pid': row[0], 'num': row[1], 'title': row[2]} if row else {})
+
+        match = re.fullmatch(r'/api/uname2uid/(.+)', path)
+        if match:
+            member = re.fullmatch(r'user(\d+)', match.group(1))
+            if member:
+                return self.send_json(TEAM_UID_BASE + int(member.group(1)))
+            return self.send_json(USER_ID if match.group(1) == USERNAME else 0)
+
+        match = re.fullmatch(r'/api/subs-user/(\d+)(?:/(\d+))?', path)
+        if match:
+            uid, since = int(match.group(1)), int(match.group(2) or 0)
+            if uid > TEAM_UID_BASE:
+                uname, history = f'user{uid - TEAM_UID_BASE}', state.member_history(uid)
+            else:
+                uname, history = USERNAME, state.subs
+            subs = [s for s in history if s[0] > since]
+            return self.send_json({'name': uname.title(), 'uname': uname, 'subs': subs})
+
+        match = re.fullmatch(r'/api/ranklist/(\d+)/(\d+)/(\d+)', path)
+        if match:
+            above, below = int(match.group(2)), int(match.group(3))
+            idx = next(i for i, r in enumerate(state.ranklist) if r['userid'] == int(match.group(1)))
+            return self.send_json(state.ranklist[max(0, idx - above):idx + below + 1])
+
+        match = re.fullmatch(r'/api/rank/(\d+)/(\d+)', path)
+        if match:
+            pos, count = int(match.group(1)), int(match.group(2))
+            return self.send_json(state.ranklist[max(0, pos - 1):pos - 1 + count])
+
+        match = re.fullmatch(r'/external/(\d+)/(\d+)\.pdf', path)
+        if match:
+            return self.send_body(b'%PDF-1.4\n' + os.urandom(64 * 1024), content_type='application/pdf')
+
+        if path == '/index.php':
+            if query.get('task') == ['login']:
+                return self.send_body(LOGIN_FORM, content_type='text/html')
+            return self.send_body(LOGGED_IN_PAGE, content_type='text/html',
+                                  headers={'Set-Cookie': 'session=bench; Path=/'})
+
+        self.send_body(json.dumps({'error': 'not found'}), status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if 'save_submission' in self.path:
+            return self.send_body(SUBMITTED_PAGE, content_type='text/html')
+        self.send_body(LOGGED_IN_PAGE, content_type='text/html',
+                       headers={'Set-Cookie': 'session=bench; Path=/'})
+
+def make_server(state, host='127.0.0.1', port=0):
+    server = http.server.ThreadingHTTPServer((host, port), UHuntHandler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+def _serve(fixtures, port_queue):
+    server = make_server(UHuntState(fixtures=fixtures))
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+def start_server_process(fixtures=None):
+    # The server runs in its own process so that its data does not count
+    # towards the peak RSS of the commands forked by the harness
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(fixtures, port_queue), daemon=True)
+    process.start()
+    return process, f'http://127.0.0.1:{port_queue.get(timeout=60)}'
+# ------------------------------------------------------------------------
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve recorded or synthetic uHunt data locally')
+    parser.add_argument('-p', '--port', type=int, default=8000)
+    parser.add_argument('-f', '--fixtures',
+        help='Directory with recorded p.json, subs-user.json and ranklist.json')
+    parser.add_argument('-s', '--size', type=int, default=1000,
+        help='Number of submissions in the synthetic history')
+    args = parser.parse_args()
+
+    server = make_server(UHuntState(fixtures=args.fixtures, history_size=args.size), port=args.port)
+    print(f'Serving on http://127.0.0.1:{server.server_address[1]}')
+    print(f'OJCLI_BASE_URL=http://127.0.0.1:{server.server_address[1]}/api')
+    print(f'OJCLI_JUDGE_URL=http://127.0.0.1:{server.server_address[1]}')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
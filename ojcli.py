@@ -1,17 +1,22 @@
 import argparse
+import array
+import collections
 import configparser
+import contextlib
 import datetime
+import functools
+import itertools
 import json
+import operator
 import os
+import pickle
 import random
 import sys
-import unicodedata
-import webbrowser
+import threading
+import time
 
-import requests
-import requests.exceptions
-
-from bs4 import BeautifulSoup
+# requests, bs4, sqlite3, webbrowser and friends are imported inside the
+# functions that use them, so commands only pay for what they need
 
 LANGUAGE_GUESS = {
     '.c': 'ANSI C',
@@ -81,20 +86,9 @@ VERDICT_COLORS = {
     90:'green'
 }
 
-PROBLEM_VOLUMES = {
-      1:100,   2:100,   3:100,   4:100,   5:100,
-      6:100,   7:100,   8:100,   9:100,  10:100,
-     11:100,  12:100,  13:100,  14:100,  15:100,
-     16:100,  17: 61,
-
-    100:100, 101:100, 102:100, 103:100, 104:100,
-    105:100, 106:100, 107:100, 108:100, 109:100,
-    110:100, 111:100, 112:100, 113:100, 114:100,
-    115:100, 116:100, 117:100, 118:100, 119:100,
-    120:100, 121:100, 122:100, 123:100, 124:100,
-    125:100, 126:100, 127:100, 128:100, 129:100,
-    130:100, 131:100, 132:100, 133:  4,
-}
+# Both are derived from the problem catalog in create_problem_lookups()
+PROBLEM_VOLUMES = None
+PROBLEM_VOLUME_INDEX = None
 
 PROBLEM_DATA = None
 PNUM_TO_PID = None
@@ -102,10 +96,107 @@ PID_TO_PNUM = None
 
 CFG = None
 USER_ID = None
-BASE_URL = 'https://uhunt.onlinejudge.org/api'
-LOGIN_URL = 'https://onlinejudge.org/index.php?option=com_comprofiler&task=login'
+USERID_CACHE_LOCK = threading.Lock()
+BASE_URL = os.getenv('OJCLI_BASE_URL', 'https://uhunt.onlinejudge.org/api')
+JUDGE_URL = os.getenv('OJCLI_JUDGE_URL', 'https://onlinejudge.org')
+LOGIN_URL = JUDGE_URL + '/index.php?option=com_comprofiler&task=login'
+SESSION_PROBE_URL = JUDGE_URL + '/index.php?option=com_onlinejudge&Itemid=25'
 _HEADERS = {'User-Agent': 'oj-cli-submit'}
 SESSION = None
+HTTP = None
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+HTTP_RETRIES = 3
+MAX_WORKERS = 8
+# Rows per ranklist request when a rank window is split into chunks
+RANK_CHUNK_SIZE = 500
+
+WATCH_MIN_INTERVAL = 1
+WATCH_MAX_INTERVAL = 30
+WATCH_TIMEOUT = 15 * 60
+
+# The watch dashboard polls every DASHBOARD_MIN_INTERVAL seconds after a
+# change or while a submission is queued, and backs off to the idle
+# interval otherwise. The rank window is refetched after a new accepted
+# problem or every DASHBOARD_RANK_INTERVAL seconds.
+DASHBOARD_MIN_INTERVAL = 5
+DASHBOARD_IDLE_INTERVAL = 120
+DASHBOARD_RANK_INTERVAL = 10 * 60
+DASHBOARD_VERDICTS = 10
+DASHBOARD_SURROUND = 3
+
+SUBMIT_URL = JUDGE_URL + '/index.php?option=com_onlinejudge&Itemid=25&page=save_submission'
+SUBMIT_RATE_LIMIT = 5
+
+# Local pre-flight checks with submit --check. {src} expands to the
+# solution files, the flag says whether RLIMIT_AS can enforce the memory
+# limit (the JVM reserves far more address space than it uses, so Java
+# gets -Xmx instead).
+LANGUAGE_TOOLCHAINS = {
+    1: (['gcc', '-O2', '-pipe', '-DONLINE_JUDGE', '-o', '{exe}', '{src}', '-lm'], ['{exe}'], True),
+    2: (['javac', '-encoding', 'UTF-8', '-d', '{build}', '{src}'],
+        ['java', '-Xmx{memory}m', '-Xss64m', '-cp', '{build}', 'Main'], False),
+    3: (['g++', '-O2', '-pipe', '-DONLINE_JUDGE', '-o', '{exe}', '{src}', '-lm'], ['{exe}'], True),
+    4: (['fpc', '-O2', '-dONLINE_JUDGE', '-FE{build}', '-o{exe}', '{src}'], ['{exe}'], True),
+    5: (['g++', '-std=c++11', '-O2', '-pipe', '-DONLINE_JUDGE', '-o', '{exe}', '{src}', '-lm'], ['{exe}'], True),
+    6: (None, ['python3', '{src}'], True),
+}
+CHECK_TIME_LIMIT = 3
+CHECK_MEMORY_LIMIT = 256
+CHECK_COMPILE_TIMEOUT = 60
+CHECK_CACHE_ENTRIES = 200
+# Part of the check cache key, bumped whenever verdicts are judged
+# differently so stale cached results are not reused
+CHECK_CACHE_FORMAT = 2
+# What each runtime prints when an allocation fails under the memory limit:
+# Python, C++, Java past -Xmx on stderr and Free Pascal's heap overflow on
+# stdout
+CHECK_MEMORY_ERRORS = (b'MemoryError', b'std::bad_alloc', b'java.lang.OutOfMemoryError',
+                       b'Runtime error 203')
+
+PAGE_OUTPUT = False
+# table, json, ndjson or csv. The machine readable formats stream plain
+# records and leave out colors and column widths.
+OUTPUT_FORMAT = 'table'
+PROFILE = None
+OUTPUT_CHUNK_LINES = 512
+
+CACHE_DIR = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.join(os.getenv('HOME'), '.cache'), 'ojcli')
+CATALOG_TTL = 7 * 24 * 60 * 60
+REFRESH_CATALOG = False
+CATALOG_STAMP = None
+# A lookup miss revalidates the cached catalog at most this often, in seconds
+CATALOG_MISS_INTERVAL = 60
+CATALOG_REVALIDATED = None
+CATALOG_LOCK = threading.Lock()
+SEARCH_LIMIT = 10
+# Megabytes of problem statement PDFs kept in the cache
+STATEMENT_CACHE_SIZE = 100
+
+# Seconds between uHunt requests when fetching a whole team with --users
+TEAM_RATE_LIMIT = 0.2
+
+# Submissions are synced at most once per SYNC_MAX_AGE seconds. Plain runs
+# always sync, the daemon relies on its background sync instead
+SYNC_MAX_AGE = 0
+LAST_SYNC = None
+
+DAEMON_SOCKET = os.path.join(CACHE_DIR, 'daemon.sock')
+DAEMON_SYNC_INTERVAL = 30
+DAEMON_PENDING_INTERVAL = 5
+# Seconds a client waits for the daemon to take its command before running
+# it in process
+DAEMON_CONNECT_TIMEOUT = 2
+DAEMON_CONFIG_STAMP = None
+# After a local submit the daemon syncs like a submission is queued for this
+# many seconds, uHunt can take a while to list a new submission
+DAEMON_SUBMIT_WINDOW = 2 * 60
+DAEMON_SUBMITTED = None
+# Commands forwarded to a running daemon. Interactive or long running ones
+# (submit and random prompt, watch, --wait and --watch poll for minutes,
+# --users fetches a whole team) stay local
+DAEMON_COMMANDS = {'verdict', 'rank', 'progress', 'stats', 'search'}
 
 # Only supporting 8 color mode for now
 ANSI_FG_COLORS = {
@@ -138,16 +229,126 @@ ANSI_DECORATIONS = {
 
 ANSI_RESET = '\u001b[0m'
 
+# ------------------------------------------------------------------------
+# HTTP client
+# ------------------------------------------------------------------------
+def is_request_error(exc):
+    # requests is imported lazily, so its exceptions can only have been
+    # raised once it is loaded
+    requests = sys.modules.get('requests')
+    return requests is not None and isinstance(exc, requests.exceptions.RequestException)
+
+def new_http_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    # Retries back off exponentially and only cover idempotent requests, so
+    # a failed submission POST is never sent twice
+    retries = Retry(total=HTTP_RETRIES, backoff_factor=0.5,
+                    status_forcelist=(500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(_HEADERS)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    session.hooks['response'].append(profile_request)
+    return session
+
+def http_session():
+    global HTTP
+    if HTTP is None:
+        HTTP = new_http_session()
+    return HTTP
+
+def http_get(url, **kwargs):
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+    return http_session().get(url, **kwargs)
+
+def api_get(api, **kwargs):
+    return http_get(BASE_URL + api, **kwargs)
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Profiling
+# ------------------------------------------------------------------------
+def start_profile():
+    global PROFILE
+    PROFILE = {'start': time.perf_counter(), 'phases': list(), 'requests': list()}
+
+@contextlib.contextmanager
+def profile_phase(name):
+    if PROFILE is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PROFILE['phases'].append({'phase': name,
+                                  'start_ms': round((start - PROFILE['start']) * 1000, 2),
+                                  'ms': round((time.perf_counter() - start) * 1000, 2)})
+
+def profile_request(response, *args, **kwargs):
+    if PROFILE is None:
+        return
+    # Bytes are taken from Content-Length, i.e. the (compressed) size on
+    # the wire, since streamed bodies have not been read at this point
+    length = response.headers.get('Content-Length')
+    PROFILE['requests'].append({'method': response.request.method,
+                                'url': response.url,
+                                'status': response.status_code,
+                                'bytes': int(length) if length is not None else None,
+                                'ms': round(response.elapsed.total_seconds() * 1000, 2)})
+
+def report_profile(fmt):
+    total = round((time.perf_counter() - PROFILE['start']) * 1000, 2)
+    phases = sorted(PROFILE['phases'], key=lambda p: p['start_ms'])
+    if fmt == 'json':
+        sys.stderr.write(json.dumps({'total_ms': total, 'phases': phases,
+                                     'requests': PROFILE['requests']}) + '\n')
+        return
+
+    lines = ['', f'Profile: {total:.2f} ms total', '', 'Phases:']
+    for p in phases:
+        lines.append('  %-16s %10.2f ms  (at %.2f ms)' % (p['phase'], p['ms'], p['start_ms']))
+    lines.extend(['', f'HTTP requests: {len(PROFILE["requests"])}'])
+    for r in PROFILE['requests']:
+        size = '%d B' % r['bytes'] if r['bytes'] is not None else '? B'
+        lines.append('  %-4s %3d %10.2f ms %12s  %s' % (r['method'], r['status'], r['ms'], size, r['url']))
+    sys.stderr.write('\n'.join(lines) + '\n')
+# ------------------------------------------------------------------------
+
+
+
 # ------------------------------------------------------------------------
 # Config functions
 # ------------------------------------------------------------------------
 class ConfigError(Exception):
     pass
 
+class LoginError(Exception):
+    pass
+
+class StaleUserIdError(Exception):
+    pass
+
+class CheckError(Exception):
+    pass
+
+class StatementError(Exception):
+    pass
+
+def config_paths():
+    return [os.path.join(os.getenv('HOME'), '.ojrc'),
+            os.path.join(os.path.dirname(sys.argv[0]), '.ojrc')]
+
 def get_config():
     cfg = configparser.ConfigParser()
-    if not cfg.read([os.path.join(os.getenv('HOME'), '.ojrc'),
-                     os.path.join(os.path.dirname(sys.argv[0]), '.ojrc')]):
+    if not cfg.read(config_paths()):
         raise ConfigError('''\
                 Failed to read config file from the home directory
                 or from the same directory as this script. Please
@@ -156,21 +357,26 @@ def get_config():
 
 def login(username, password):
     global SESSION
-    SESSION = requests.Session()
+    from bs4 import BeautifulSoup
+
+    SESSION = new_http_session()
     login_args = {'username': username,
                   'passwd': password,
                   'remember': 'yes'
                  }
 
     # Get hidden form data from HTML
-    html_data = requests.get(LOGIN_URL, headers=_HEADERS)
-    soup = BeautifulSoup(html_data.content, 'html.parser')
-    form = soup.find('form', {'id': 'mod_loginform'})
-    inputs = form.find_all('input', {'type': 'hidden'})
-    for input in inputs:
-        login_args[input['name']] = input['value']
-
-    return SESSION.post(LOGIN_URL, data=login_args, headers=_HEADERS)
+    html_data = SESSION.get(LOGIN_URL, headers=_HEADERS,
+                            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    with profile_phase('login-parse'):
+        soup = BeautifulSoup(html_data.content, 'html.parser')
+        form = soup.find('form', {'id': 'mod_loginform'})
+        inputs = form.find_all('input', {'type': 'hidden'})
+        for input in inputs:
+            login_args[input['name']] = input['value']
+
+    return SESSION.post(LOGIN_URL, data=login_args, headers=_HEADERS,
+                        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
 
 def login_from_config(cfg):
     username = cfg.get('user', 'username')
@@ -183,11 +389,385 @@ def login_from_config(cfg):
 
     return login(username, password)
 
-def get_userid(name):
+def get_userid(name, refresh=False, limiter=None):
+    userids = read_cache('userids.pickle') or dict()
+    if not refresh and name in userids:
+        return userids[name]
+
+    if limiter:
+        limiter.wait()
     name_api = f'/uname2uid/{name}'
-    full_url = BASE_URL + name_api
-    response = requests.get(full_url)
-    return str(response.json())
+    response = api_get(name_api)
+    uid = str(response.json())
+
+    # uHunt answers 0 for unknown usernames, which is not worth remembering.
+    # The cache is re-read under the lock so concurrent lookups keep each
+    # other's entries.
+    if uid != '0':
+        with USERID_CACHE_LOCK:
+            userids = read_cache('userids.pickle') or dict()
+            userids[name] = uid
+            try:
+                write_cache('userids.pickle', userids)
+            except OSError:
+                pass
+    return uid
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Cache functions
+# ------------------------------------------------------------------------
+def cache_path(name):
+    global CACHE_DIR
+    return os.path.join(CACHE_DIR, name)
+
+def read_cache(name):
+    try:
+        with open(cache_path(name), 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+def write_cache(name, value, private=False):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(name)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    mode = 0o600 if private else 0o644
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def remove_cache(name):
+    try:
+        os.remove(cache_path(name))
+    except OSError:
+        pass
+
+def load_catalog_cache():
+    cached = read_cache('catalog.pickle')
+    if not isinstance(cached, dict) or 'data' not in cached:
+        return None
+    return cached
+
+def save_catalog_cache(catalog):
+    try:
+        write_cache('catalog.pickle', catalog)
+    except OSError:
+        pass
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Submission store
+# ------------------------------------------------------------------------
+# Submissions still waiting on the judge, re-fetched on every sync
+PENDING_VERDICTS = (0, 20)
+
+def open_submission_store(uid):
+    import sqlite3
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(cache_path(f'subs-{uid}.sqlite'))
+    # The store is only a cache of uHunt data, so it trades durability on
+    # power loss for not waiting on an fsync per transaction
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('''CREATE TABLE IF NOT EXISTS subs (
+                        sid INTEGER PRIMARY KEY,
+                        pid INTEGER NOT NULL,
+                        verdict INTEGER NOT NULL,
+                        runtime INTEGER NOT NULL,
+                        submit_time INTEGER NOT NULL,
+                        language INTEGER NOT NULL,
+                        rank INTEGER NOT NULL)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS subs_pid ON subs (pid)')
+    conn.execute('CREATE INDEX IF NOT EXISTS subs_verdict ON subs (verdict, pid)')
+    return conn
+
+def sync_submissions(uid, uname=None, limiter=None):
+    with profile_phase('sync'), contextlib.closing(open_submission_store(uid)) as conn:
+        pending = ', '.join(str(v) for v in PENDING_VERDICTS)
+        since = conn.execute(f'SELECT MIN(sid) - 1 FROM subs WHERE verdict IN ({pending})').fetchone()[0]
+        if since is None:
+            since = conn.execute('SELECT COALESCE(MAX(sid), 0) FROM subs').fetchone()[0]
+
+        if limiter:
+            limiter.wait()
+        sync_api = f'/subs-user/{uid}/{since}'
+        meta = dict()
+        with contextlib.closing(api_get(sync_api, stream=True)) as response:
+            response.encoding = response.encoding or 'utf-8'
+            chunks = response.iter_content(chunk_size=64 * 1024, decode_unicode=True)
+            subs = iter_json_array(chunks, 'subs', meta)
+            # The transaction is rolled back if the history turns out to
+            # belong to somebody else
+            with conn:
+                count = conn.executemany('INSERT OR REPLACE INTO subs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                         (row[:7] for row in subs)).rowcount
+                if uname is not None and str(meta.get('uname', '')).lower() != uname.lower():
+                    raise StaleUserIdError(f'User id {uid} does not belong to {uname}')
+        return count
+
+def submissions_query(columns, pid=None, limit=None):
+    query = f'SELECT {columns} FROM subs'
+    params = list()
+    if pid is not None:
+        query += ' WHERE pid = ?'
+        params.append(pid)
+    query += ' ORDER BY sid DESC'
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return query, params
+
+def iter_submissions(uid, pid=None, limit=None):
+    query, params = submissions_query('sid, pid, verdict, runtime, submit_time, language, rank',
+                                      pid=pid, limit=limit)
+    with contextlib.closing(open_submission_store(uid)) as conn:
+        for row in conn.execute(query, params):
+            yield list(row)
+
+def query_submissions(uid, pid=None, limit=None):
+    return list(iter_submissions(uid, pid=pid, limit=limit))
+
+class SubmissionTable:
+    # Typed columns for a submission history. Aggregations run over whole
+    # columns with C-level counting instead of per-row Python loops.
+    COLUMNS = (('sid', 'q'), ('pid', 'l'), ('verdict', 'h'), ('runtime', 'l'),
+               ('submit_time', 'q'), ('language', 'h'), ('rank', 'l'))
+
+    def __init__(self):
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, array.array(typecode))
+
+    @classmethod
+    def from_rows(cls, rows):
+        table = cls()
+        appends = [getattr(table, name).append for name, _ in cls.COLUMNS]
+        for row in rows:
+            for append, value in zip(appends, row):
+                append(value)
+        return table
+
+    def __len__(self):
+        return len(self.sid)
+
+    def extend(self, other):
+        for name, _ in self.COLUMNS:
+            getattr(self, name).extend(getattr(other, name))
+
+    def histogram(self, column):
+        return collections.Counter(getattr(self, column))
+
+    def accepted_mask(self):
+        return map(operator.eq, self.verdict, itertools.repeat(90))
+
+    def accepted_pids(self):
+        return set(itertools.compress(self.pid, self.accepted_mask()))
+
+    def monthly_volume(self):
+        # Count per day first, then fold the few distinct days into months
+        months = collections.Counter()
+        days = map(operator.floordiv, self.submit_time, itertools.repeat(86400))
+        for day, count in collections.Counter(days).items():
+            months[datetime.datetime.utcfromtimestamp(day * 86400).strftime('%Y-%m')] += count
+        return dict(sorted(months.items()))
+
+    def volume_ac_ratio(self, pid_to_pnum):
+        totals = collections.Counter()
+        accepted = collections.Counter()
+        for pid, count in self.histogram('pid').items():
+            totals[pid_to_pnum[pid] // 100] += count
+        for pid, count in collections.Counter(itertools.compress(self.pid, self.accepted_mask())).items():
+            accepted[pid_to_pnum[pid] // 100] += count
+        return {v: (accepted[v], totals[v]) for v in sorted(totals)}
+
+    def runtime_percentiles(self, percentiles=(50, 75, 90, 99, 100)):
+        runtimes = sorted(itertools.compress(self.runtime, self.accepted_mask()))
+        if not runtimes:
+            return dict()
+        # Nearest rank: the smallest runtime with at least p percent of the
+        # runtimes at or below it
+        return {p: runtimes[max(0, (len(runtimes) * p + 99) // 100 - 1)]
+                for p in percentiles}
+
+def accepted_pids(uid):
+    with contextlib.closing(open_submission_store(uid)) as conn:
+        return set(row[0] for row in conn.execute('SELECT DISTINCT pid FROM subs WHERE verdict = 90'))
+
+def distinct_submission_values(uid, column, pid=None, limit=None):
+    query, params = submissions_query(column, pid=pid, limit=limit)
+    with contextlib.closing(open_submission_store(uid)) as conn:
+        return [row[0] for row in conn.execute(f'SELECT DISTINCT {column} FROM ({query})', params)]
+
+def has_pending_submissions(uid):
+    pending = ', '.join(str(v) for v in PENDING_VERDICTS)
+    with contextlib.closing(open_submission_store(uid)) as conn:
+        return conn.execute(f'SELECT 1 FROM subs WHERE verdict IN ({pending}) LIMIT 1').fetchone() is not None
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Rank snapshot store
+# ------------------------------------------------------------------------
+# (age, bucket) pairs: snapshots at least age old are thinned out to the
+# latest one per user and bucket, i.e. hourly right away, daily after a week
+# and weekly after three months
+RANK_SNAPSHOT_TIERS = ((0, 3600), (7 * 86400, 86400), (90 * 86400, 7 * 86400))
+
+def open_rank_store():
+    import sqlite3
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(cache_path('ranks.sqlite'))
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('''CREATE TABLE IF NOT EXISTS snapshots (
+                        userid INTEGER NOT NULL,
+                        taken INTEGER NOT NULL,
+                        rank INTEGER NOT NULL,
+                        ac INTEGER NOT NULL,
+                        nos INTEGER NOT NULL,
+                        PRIMARY KEY (userid, taken)) WITHOUT ROWID''')
+    conn.execute('CREATE INDEX IF NOT EXISTS snapshots_taken ON snapshots (taken)')
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                        userid INTEGER PRIMARY KEY,
+                        username TEXT NOT NULL,
+                        name TEXT NOT NULL)''')
+    return conn
+
+def save_rank_snapshot(rows, taken=None):
+    import sqlite3
+
+    # Snapshots are a side cache, a broken store never fails rank or watch
+    taken = int(time.time()) if taken is None else taken
+    try:
+        with contextlib.closing(open_rank_store()) as conn, conn:
+            conn.executemany('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)',
+                             ((r['userid'], taken, r['rank'], r['ac'], r['nos']) for r in rows))
+            conn.executemany('INSERT OR REPLACE INTO users VALUES (?, ?, ?)',
+                             ((r['userid'], r['username'], r['name']) for r in rows))
+            compact_rank_store(conn, taken)
+    except (sqlite3.Error, OSError):
+        pass
+
+def compact_rank_store(conn, now):
+    for age, bucket in RANK_SNAPSHOT_TIERS:
+        conn.execute('''DELETE FROM snapshots
+                        WHERE taken <= :cutoff AND EXISTS (
+                            SELECT 1 FROM snapshots AS newer
+                            WHERE newer.userid = snapshots.userid
+                              AND newer.taken > snapshots.taken
+                              AND newer.taken <= :cutoff
+                              AND newer.taken / :bucket = snapshots.taken / :bucket)''',
+                     {'cutoff': now - age, 'bucket': bucket})
+
+def latest_rank_window(conn, uid):
+    # The users of the most recent snapshot that contains uid
+    taken = conn.execute('SELECT MAX(taken) FROM snapshots WHERE userid = ?', (uid,)).fetchone()[0]
+    if taken is None:
+        return None, list()
+    rows = conn.execute('''SELECT s.userid, s.rank, s.ac, u.username
+                           FROM snapshots AS s JOIN users AS u USING (userid)
+                           WHERE s.taken = ? ORDER BY s.rank''', (taken,)).fetchall()
+    return taken, rows
+
+def rank_baseline(conn, userid, since, before):
+    # The last snapshot of the user at or before since. When history does
+    # not reach back that far, the oldest one taken before the current one.
+    row = conn.execute('''SELECT taken, rank, ac FROM snapshots
+                          WHERE userid = ? AND taken <= ? ORDER BY taken DESC LIMIT 1''',
+                       (userid, since)).fetchone()
+    if row is None:
+        row = conn.execute('''SELECT taken, rank, ac FROM snapshots
+                              WHERE userid = ? AND taken < ? ORDER BY taken LIMIT 1''',
+                           (userid, before)).fetchone()
+    return row
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Statement cache
+# ------------------------------------------------------------------------
+def statement_url(num):
+    return f'{JUDGE_URL}/external/{num // 100}/{num}.pdf'
+
+def statement_path(num):
+    return os.path.join(CACHE_DIR, 'statements', f'{num}.pdf')
+
+def cached_statement(num):
+    # The modification time doubles as the last use, so the LRU order
+    # survives filesystems mounted with noatime
+    path = statement_path(num)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+def fetch_statement(num):
+    path = cached_statement(num)
+    if path:
+        return path
+
+    path = statement_path(num)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with contextlib.closing(http_get(statement_url(num), stream=True)) as response:
+            if response.status_code != 200:
+                raise StatementError(f'No statement for problem {num} (HTTP {response.status_code}).')
+            chunks = response.iter_content(chunk_size=64 * 1024)
+            first = next(chunks, b'')
+            if not first.startswith(b'%PDF'):
+                raise StatementError(f'No statement for problem {num}.')
+            with open(tmp_path, 'wb') as f:
+                f.write(first)
+                for chunk in chunks:
+                    f.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+def statement_cache_limit():
+    try:
+        size = load_config().getint('cache', 'statements_size', fallback=STATEMENT_CACHE_SIZE)
+    except ConfigError:
+        size = STATEMENT_CACHE_SIZE
+    return size * 1024 * 1024
+
+def evict_statements(limit):
+    # Keeps the most recently used statements that fit into limit bytes,
+    # and clears out downloads left behind by interrupted runs
+    try:
+        entries = list(os.scandir(os.path.join(CACHE_DIR, 'statements')))
+    except OSError:
+        return
+    stale = time.time() - 60 * 60
+    files = list()
+    for entry in entries:
+        stat = entry.stat()
+        if entry.name.endswith('.pdf'):
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        elif entry.name.endswith('.tmp') and stat.st_mtime < stale:
+            files.append((0, limit + 1, entry.path))
+
+    total = 0
+    for _, size, path in sorted(files, reverse=True):
+        total += size
+        if total > limit:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 # ------------------------------------------------------------------------
 
 
@@ -195,41 +775,290 @@ def get_userid(name):
 # ------------------------------------------------------------------------
 # Various helper functions
 # ------------------------------------------------------------------------
-def get_longest_field(data, column):
-    longest = -1
-    for row in range(len(data)):
-        if len(str(data[row][column])) > longest:
-            longest = len(str(data[row][column]))
-    return longest
-
-def get_longest_fields(data):
-    longests = list()
-    for key in data[0].keys():
-        longests.append(get_longest_field(data, key))
-    return longests
-
-def get_problem_data():
-    problem_data_url = '/p'
-    full_url = BASE_URL + problem_data_url
-    response = requests.get(full_url)
+class RateLimiter:
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+def iter_json_array(chunks, key, meta):
+    # Yields the items of the array stored under `key` in a top-level JSON
+    # object while it is still being downloaded. Every other top-level
+    # field is decoded into `meta`.
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+
+    def fill():
+        nonlocal buf, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError('Unexpected end of JSON stream')
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] in chars):
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            fill()
+
+    def value():
+        nonlocal pos
+        while True:
+            try:
+                val, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                fill()
+                continue
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(buf):
+                fill()
+                continue
+            pos = end
+            return val
+
+    if skip('') != '{':
+        raise ValueError('Expected a JSON object')
+    pos += 1
+    while skip(',') != '}':
+        name = value()
+        if skip(':') == '[' and name == key:
+            pos += 1
+            while skip(',') != ']':
+                yield value()
+            pos += 1
+        else:
+            meta[name] = value()
+
+def get_problem_data(revalidate=False):
+    global CATALOG_TTL
+    global REFRESH_CATALOG
+    global CATALOG_STAMP
+
+    cached = load_catalog_cache()
+    if cached:
+        CATALOG_STAMP = cached.get('downloaded', cached['fetched'])
+    if (cached and not REFRESH_CATALOG and not revalidate
+            and time.time() - cached['fetched'] < CATALOG_TTL):
+        return cached['data']
+
+    problem_data_api = '/p'
+    headers = dict()
+    if cached and not REFRESH_CATALOG:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    try:
+        response = api_get(problem_data_api, headers=headers)
+    except Exception as exc:
+        if cached and is_request_error(exc):
+            return cached['data']
+        raise
+
+    if response.status_code == 304 and cached:
+        cached['fetched'] = time.time()
+        save_catalog_cache(cached)
+        return cached['data']
+
     data = dict()
     for row in response.json():
         data[row[0]] = row
+    CATALOG_STAMP = time.time()
+    save_catalog_cache({'fetched': CATALOG_STAMP,
+                        'downloaded': CATALOG_STAMP,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'data': data})
     return data
 
 def create_problem_lookups():
     global PROBLEM_DATA
     global PNUM_TO_PID
     global PID_TO_PNUM
+    global PROBLEM_VOLUMES
+    global PROBLEM_VOLUME_INDEX
 
-    PNUM_TO_PID = dict()
-    PID_TO_PNUM = dict()
+    # The lookups are built before they are published, so threads reading
+    # them during a revalidation never see a half filled table
+    pnum_to_pid = dict()
+    pid_to_pnum = dict()
 
     for p in PROBLEM_DATA:
         pid = PROBLEM_DATA[p][0]
         pnum = PROBLEM_DATA[p][1]
-        PID_TO_PNUM[pid] = pnum
-        PNUM_TO_PID[pnum] = pid
+        pid_to_pnum[pid] = pnum
+        pnum_to_pid[pnum] = pid
+
+    volume_index = dict()
+    for pnum in sorted(pnum_to_pid):
+        volume_index.setdefault(pnum // 100, list()).append(pnum)
+    PNUM_TO_PID, PID_TO_PNUM = pnum_to_pid, pid_to_pnum
+    PROBLEM_VOLUME_INDEX = volume_index
+    PROBLEM_VOLUMES = {v: len(nums) for v, nums in volume_index.items()}
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Resource loaders
+# ------------------------------------------------------------------------
+def requires(*resources):
+    def decorator(func):
+        func.resources = frozenset(resources)
+        return func
+    return decorator
+
+def load_config():
+    global CFG
+    if CFG is None:
+        CFG = get_config()
+    return CFG
+
+def load_catalog():
+    global PROBLEM_DATA
+    global CATALOG_TTL
+
+    if PROBLEM_DATA is None:
+        try:
+            CATALOG_TTL = load_config().getint('cache', 'catalog_ttl', fallback=CATALOG_TTL)
+        except ConfigError:
+            pass
+        with profile_phase('catalog'):
+            PROBLEM_DATA = get_problem_data()
+            create_problem_lookups()
+    return PROBLEM_DATA
+
+def catalog_has(pids=(), pnums=()):
+    # The cached catalog can predate a new problem. A miss revalidates it
+    # with a conditional request before the lookup gives up.
+    global PROBLEM_DATA
+    global PNUM_TO_PID
+    global CATALOG_REVALIDATED
+
+    pids = set(pids)
+    pnums = set(pnums)
+    load_catalog()
+
+    def complete():
+        return pids.issubset(PROBLEM_DATA) and pnums.issubset(PNUM_TO_PID)
+
+    if complete():
+        return True
+    with CATALOG_LOCK:
+        if complete():
+            return True
+        if CATALOG_REVALIDATED is not None and time.monotonic() - CATALOG_REVALIDATED < CATALOG_MISS_INTERVAL:
+            return False
+        CATALOG_REVALIDATED = time.monotonic()
+        with profile_phase('catalog'):
+            data = get_problem_data(revalidate=True)
+            PROBLEM_DATA = data
+            create_problem_lookups()
+    return complete()
+
+def require_pids(pids):
+    global PROBLEM_DATA
+
+    pids = set(pids)
+    if not catalog_has(pids=pids):
+        unknown = ', '.join(str(p) for p in sorted(pids) if p not in PROBLEM_DATA)
+        print(f'Unknown problem (problem id {unknown})!')
+        sys.exit(1)
+
+def load_userid():
+    global USER_ID
+    if USER_ID is None:
+        with profile_phase('userid'):
+            USER_ID = get_userid(load_config().get('user', 'username'))
+    return USER_ID
+
+def revalidate_userid():
+    global USER_ID
+    USER_ID = get_userid(load_config().get('user', 'username'), refresh=True)
+    return USER_ID
+
+def is_own_username(uname):
+    return str(uname).lower() == load_config().get('user', 'username').lower()
+
+def fan_out(*calls):
+    if len(calls) == 1:
+        return [calls[0]()]
+    import concurrent.futures
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(calls), MAX_WORKERS)) as pool:
+        futures = [pool.submit(call) for call in calls]
+        return [future.result() for future in futures]
+
+def prefetch(resources):
+    # The login session is left out on purpose: commands that need it ask
+    # for confirmation first and log in lazily afterwards
+    loaders = {'catalog': load_catalog, 'userid': load_userid}
+    calls = [loaders[r] for r in sorted(resources) if r in loaders]
+    if calls:
+        fan_out(*calls)
+
+def load_session():
+    global SESSION
+    if SESSION is None:
+        with profile_phase('session-probe'):
+            SESSION = restore_session(load_config().get('user', 'username'))
+    if SESSION is None:
+        with profile_phase('login'):
+            login_reply = login_from_config(load_config())
+        plain_result = login_reply.content.decode('utf-8').replace('<br />', '\n')
+        if not 'Logout' in plain_result:
+            SESSION = None
+            raise LoginError('Login failed!')
+        save_session(load_config().get('user', 'username'), SESSION)
+    return SESSION
+
+def restore_session(username):
+    import requests
+
+    saved = read_cache('session.pickle')
+    if not isinstance(saved, dict) or saved.get('username') != username:
+        return None
+    session = new_http_session()
+    session.cookies.update(saved['cookies'])
+    try:
+        logged_in = probe_session(session)
+    except requests.exceptions.RequestException:
+        return None
+    if not logged_in:
+        forget_session()
+        return None
+    return session
+
+def probe_session(session):
+    probe = session.get(SESSION_PROBE_URL, headers=_HEADERS,
+                        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    return 'Logout' in probe.content.decode('utf-8', 'replace')
+
+def save_session(username, session):
+    try:
+        write_cache('session.pickle', {'username': username, 'cookies': session.cookies},
+                    private=True)
+    except OSError:
+        pass
+
+def forget_session():
+    global SESSION
+    SESSION = None
+    remove_cache('session.pickle')
 # ------------------------------------------------------------------------
 
 
@@ -265,203 +1094,296 @@ def add_decoration(text, decoration):
 # Pretty printers
 # ------------------------------------------------------------------------
 def display_len(text):
+    if text.isascii():
+        return len(text)
+    return wide_display_len(text)
+
+@functools.lru_cache(maxsize=4096)
+def wide_display_len(text):
+    import unicodedata
     res = 0
     for char in text:
         res += 2 if unicodedata.east_asian_width(char) == 'W' else 1
     return res
 
-def pretty_print_verdict(vdata):
-    global USER_ID
+def clip_text(text, width):
+    while text and display_len(text) + 1 > width:
+        text = text[:-1]
+    return text + '\u2026'
 
-    print('\n')
-    verdict_headers = ['PROBLEM', 'VERDICT', 'LANG', 'TIME', 'RANK', 'SUBMIT TIME']
-
-    col_widths = [-1] * 6
-    table_data = [None] * 6
-    table_dlen = [None] * 6
-
-    for i in range(6):
-        table_data[i] = list()
-        table_dlen[i] = list()
-
-    plong = -1
-    for row in range(len(vdata)):
-        pid = vdata[row][1]
-        ps = str(PROBLEM_DATA[pid][1]) + ' ' + str(PROBLEM_DATA[pid][2])
-        if len(ps) > plong:
-            plong = len(ps)
-        table_dlen[0].append(len(ps))
-        table_data[0].append(ps)
-    col_widths[0] = plong
-
-    vlong = -1
-    for row in range(len(vdata)):
-        ver = vdata[row][2]
-        vs = VERDICT_STRINGS[ver]
-        if len(vs) > vlong:
-            vlong = len(vs)
-        table_dlen[1].append(len(vs))
-        table_data[1].append(add_fg_color(vs, VERDICT_COLORS[ver]))
-    col_widths[1] = vlong
-
-    llong = -1
-    for row in range(len(vdata)):
-        lan = vdata[row][5]
-        ls = LANGUAGE_STRINGS[lan]
-        if len(ls) > llong:
-            llong = len(ls)
-        table_dlen[2].append(len(ls))
-        table_data[2].append(add_fg_color(ls, LANGUAGE_COLORS[lan]))
-    col_widths[2] = llong
-
-    for row in range(len(vdata)):
-        rt = int(vdata[row][3])
-        rt = '%1.3f' % (rt / 1000.0)
-        table_dlen[3].append(len(rt))
-        table_data[3].append(rt)
-    col_widths[3] = 5
-
-    rlong = -1
-    for row in range(len(vdata)):
-        rank = vdata[row][6]
-        rs = str(rank) if rank > 0 else '-'
-        if len(rs) > rlong:
-            rlong = len(rs)
-        table_dlen[4].append(len(rs))
-        table_data[4].append(rs)
-    col_widths[4] = rlong
-
-    slong = -1
-    for row in range(len(vdata)):
-        time = vdata[row][4]
-        ss = datetime.datetime.utcfromtimestamp(time).strftime('%Y-%m-%d %H:%M:%S')
-        if len(ss) > slong:
-            slong = len(ss)
-        table_dlen[5].append(len(ss))
-        table_data[5].append(ss)
-    col_widths[5] = slong
-
-    top_div = ""
-    div = ""
-    bottom_div = ""
-    for i in range(len(col_widths)):
-        col_widths[i] = max(col_widths[i], len(verdict_headers[i]))
-    for w in col_widths:
-        top_div += ('\u2566\u2550' + ('\u2550' * (w+1)))
-        div += ('\u256C\u2550' + ('\u2550' * (w+1)))
-        bottom_div += ('\u2569\u2550' + ('\u2550' * (w+1)))
-
-    top_div = top_div.replace('\u2566', '\u2554', 1)
-    top_div += '\u2557'
-
-    div = div.replace('\u256C', '\u2560', 1)
-    div += '\u2563'
-
-    bottom_div = bottom_div.replace('\u2569', '\u255A', 1)
-    bottom_div += '\u255D'
-    print(top_div)
-
-    line = ""
-    for i in range(len(col_widths)):
-        diff = col_widths[i] - len(verdict_headers[i])
-        pad = diff // 2
-        line += '\u2551 '
-        if diff % 2 == 1:
-            line += ' '
-        line += (' ' * pad) + add_decoration(verdict_headers[i].upper(), 'bold') + (' ' * pad)
-        line += ' '
-    line += '\u2551'
-    print(line)
-
-    for row in range(len(vdata)):
-        line = ''
-        for i in range(len(table_data)):
-            diff = col_widths[i] - table_dlen[i][row]
-            pad = diff // 2
-            line += '\u2551 '
-            if diff % 2 == 1:
-                line += ' '
-            line += (' ' * pad) + table_data[i][row] + (' ' * pad)
-            line += ' '
-        line += '\u2551'
-        print(div)
-        print(line)
+def write_lines(lines):
+    global PAGE_OUTPUT
 
-    print(bottom_div)
-    print('\n')
+    out = sys.stdout
+    pager = None
+    if PAGE_OUTPUT and sys.stdout.isatty():
+        import subprocess
+        pager = subprocess.Popen(os.getenv('PAGER') or 'less -R', shell=True,
+                                 stdin=subprocess.PIPE, encoding='utf-8')
+        out = pager.stdin
 
+    try:
+        with profile_phase('render'):
+            write_chunks(out, lines)
+    except BrokenPipeError:
+        pass
+    finally:
+        if pager:
+            try:
+                pager.stdin.close()
+            except BrokenPipeError:
+                pass
+            pager.wait()
+
+def write_chunks(out, lines):
+    # Lines are formatted lazily and written in chunks, so small tables go
+    # out in one write and a pager shows the first screen early
+    chunk = list()
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= OUTPUT_CHUNK_LINES:
+            out.write('\n'.join(chunk) + '\n')
+            out.flush()
+            chunk.clear()
+    if chunk:
+        out.write('\n'.join(chunk) + '\n')
+    out.flush()
+
+def machine_output():
+    return OUTPUT_FORMAT != 'table'
+
+def status_stream():
+    # Notes around machine readable records go to stderr, so stdout stays
+    # parseable
+    return sys.stderr if machine_output() else sys.stdout
+
+def write_records(fields, records):
+    write_lines(format_records(fields, records))
+
+def format_records(fields, records):
+    if OUTPUT_FORMAT == 'csv':
+        import csv
+        import io
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='')
+
+        def csv_line(values):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(values)
+            return buffer.getvalue()
+
+        yield csv_line(fields)
+        for record in records:
+            yield csv_line(record)
+    elif OUTPUT_FORMAT == 'ndjson':
+        for record in records:
+            yield json.dumps(dict(zip(fields, record)))
+    else:
+        # A JSON array written one element per line. Each element is held
+        # back until the next one shows whether it needs a comma.
+        yield '['
+        previous = None
+        for record in records:
+            if previous is not None:
+                yield '  ' + previous + ','
+            previous = json.dumps(dict(zip(fields, record)))
+        if previous is not None:
+            yield '  ' + previous
+        yield ']'
+
+def table_cell(text, color=None, decoration=None):
+    styled = text
+    if color:
+        styled = add_fg_color(styled, color)
+    if decoration:
+        styled = add_decoration(styled, decoration)
+    return (text, styled)
+
+def render_table(headers, rows, widths=None):
+    # Cells are plain strings or (text, styled text) pairs. Without fixed
+    # widths the rows are measured in a single pass before rendering.
+    if widths is None:
+        widths = [len(h) for h in headers]
+        measured = list()
+        for row in rows:
+            cells = list()
+            for i, cell in enumerate(row):
+                text, styled = (cell, cell) if isinstance(cell, str) else cell
+                width = display_len(text)
+                if width > widths[i]:
+                    widths[i] = width
+                cells.append((styled, width))
+            measured.append(cells)
+        rows = measured
+    else:
+        rows = ([((c, display_len(c)) if isinstance(c, str) else (c[1], display_len(c[0])))
+                 for c in row] for row in rows)
+    return table_lines(headers, widths, rows)
 
-def pretty_print_rank(rank_data):
-    global USER_ID
+def table_lines(headers, widths, rows):
+    top_div = '\u2554' + '\u2566'.join('\u2550' * (w+2) for w in widths) + '\u2557'
+    div = '\u2560' + '\u256C'.join('\u2550' * (w+2) for w in widths) + '\u2563'
+    bottom_div = '\u255A' + '\u2569'.join('\u2550' * (w+2) for w in widths) + '\u255D'
 
-    print('\n')
-    keys_to_pop = ['old', 'activity']
-    for k in keys_to_pop:
-        for row in range(len(rank_data)):
-            rank_data[row].pop(k, None)
-    rank_keys = list(rank_data[0].keys())
-    col_widths = get_longest_fields(rank_data)
-    top_div = ""
-    div = ""
-    bottom_div = ""
-    for i in range(len(col_widths)):
-        col_widths[i] = max(col_widths[i], len(rank_keys[i]))
-    for w in col_widths:
-        top_div += ('\u2566\u2550' + ('\u2550' * (w+1)))
-        div += ('\u256C\u2550' + ('\u2550' * (w+1)))
-        bottom_div += ('\u2569\u2550' + ('\u2550' * (w+1)))
-
-    top_div = top_div.replace('\u2566', '\u2554', 1)
-    top_div += '\u2557'
-
-    div = div.replace('\u256C', '\u2560', 1)
-    div += '\u2563'
-
-    bottom_div = bottom_div.replace('\u2569', '\u255A', 1)
-    bottom_div += '\u255D'
-    print(top_div)
-
-    line = ""
-    for i in range(len(col_widths)):
-        diff = col_widths[i] - len(rank_keys[i])
-        pad = diff // 2
-        line += '\u2551 '
-        if diff % 2 == 1:
-            line += ' '
-        line += (' ' * pad) + add_decoration(rank_keys[i].upper(), 'bold') + (' ' * pad)
-        line += ' '
-    line += '\u2551'
-    print(line)
-
-    for r in rank_data:
-        line = ""
-        user = r['userid'] == int(USER_ID)
-        rkeys = list(r.keys())
-        for i in range(len(col_widths)):
-            if isinstance(r[rkeys[i]], int):
-                klen = len(str(r[rkeys[i]]))
-                kstr = str(r[rkeys[i]])
-            elif isinstance(r[rkeys[i]], str):
-                klen = display_len(r[rkeys[i]])
-                kstr = str(r[rkeys[i]])
-
-            if user:
-                kstr = add_fg_color(kstr, 'yellow')
-                kstr = add_decoration(kstr, 'bold')
-
-            diff = col_widths[i] - klen
+    def format_line(cells):
+        line = ''
+        for (styled, width), col_width in zip(cells, widths):
+            diff = col_width - width
             pad = diff // 2
-            line += '\u2551 '
-            if diff % 2 == 1:
-                line += ' '
-            line += (' ' * pad) + kstr + (' ' * pad)
-            line += ' '
-        line += '\u2551'
-        print(div)
-        print(line)
+            line += '\u2551 ' + (' ' * (diff - pad)) + styled + (' ' * pad) + ' '
+        return line + '\u2551'
+
+    yield '\n'
+    yield top_div
+    yield format_line([(add_decoration(h.upper(), 'bold'), len(h)) for h in headers])
+    for cells in rows:
+        yield div
+        yield format_line(cells)
+    yield bottom_div
+    yield '\n'
+
+VERDICT_HEADERS = ['PROBLEM', 'VERDICT', 'LANG', 'TIME', 'RANK', 'SUBMIT TIME']
+
+def verdict_cells(row):
+    pid, ver, runtime, time, lan, rank = row[1:7]
+    return [str(PROBLEM_DATA[pid][1]) + ' ' + str(PROBLEM_DATA[pid][2]),
+            table_cell(VERDICT_STRINGS[ver], VERDICT_COLORS[ver]),
+            table_cell(LANGUAGE_STRINGS[lan], LANGUAGE_COLORS[lan]),
+            '%1.3f' % (int(runtime) / 1000.0),
+            str(rank) if rank > 0 else '-',
+            datetime.datetime.utcfromtimestamp(time).strftime('%Y-%m-%d %H:%M:%S')]
+
+VERDICT_FIELDS = ['sid', 'problem', 'title', 'verdict', 'language', 'runtime', 'rank', 'submit_time']
+
+def verdict_record(row):
+    sid, pid, ver, runtime, time, lan, rank = row[:7]
+    return (sid, PROBLEM_DATA[pid][1], PROBLEM_DATA[pid][2], VERDICT_STRINGS[ver],
+            LANGUAGE_STRINGS[lan], runtime / 1000.0, rank if rank > 0 else None,
+            datetime.datetime.utcfromtimestamp(time).strftime('%Y-%m-%dT%H:%M:%SZ'))
+
+def pretty_print_verdict(vdata, widths=None):
+    load_catalog()
+    if machine_output():
+        write_records(VERDICT_FIELDS, (verdict_record(row) for row in vdata))
+        return
+    write_lines(render_table(VERDICT_HEADERS, (verdict_cells(row) for row in vdata), widths=widths))
+
+RANK_FIELDS = ['rank', 'userid', 'name', 'username', 'ac', 'nos']
+
+def rank_widths(rows):
+    widths = [len(k) for k in RANK_FIELDS]
+    for r in rows:
+        for i, key in enumerate(RANK_FIELDS):
+            widths[i] = max(widths[i], display_len(str(r[key])))
+    return widths
+
+# Free text columns, the only ones clipped when a later chunk is wider
+RANK_TEXT_FIELDS = ('name', 'username')
+
+def pretty_print_rank(chunks, measured=(), last_rank=None):
+    # chunks yields lists of rows in rank order. The columns are sized from
+    # the measured rows and the first chunk, so the table is written while
+    # later chunks are still being fetched. With unmeasured chunks left,
+    # last_rank bounds the rank column, the first chunk holds the highest
+    # AC count and the other numbers get one more digit. Longer names are
+    # clipped, numbers never are.
+    load_userid()
+    chunks = iter(chunks)
+    if machine_output():
+        write_records(RANK_FIELDS, (tuple(r.get(k) for k in RANK_FIELDS)
+                                    for chunk in chunks for r in chunk))
+        return
+
+    first = next(chunks, [])
+    widths = rank_widths(itertools.chain(measured, first))
+    if last_rank is not None:
+        for i, key in enumerate(RANK_FIELDS):
+            if key == 'rank':
+                widths[i] = max(widths[i], len(str(last_rank)))
+            elif key in ('userid', 'nos'):
+                widths[i] += 1
+    uid = int(USER_ID)
+
+    def rank_cells(r):
+        cells = list()
+        for key, width in zip(RANK_FIELDS, widths):
+            text = str(r[key])
+            if key in RANK_TEXT_FIELDS and display_len(text) > width:
+                text = clip_text(text, width)
+            cells.append(table_cell(text, 'yellow', 'bold') if r['userid'] == uid else text)
+        return cells
+
+    rows = (rank_cells(r) for chunk in itertools.chain([first], chunks) for r in chunk)
+    write_lines(render_table(RANK_FIELDS, rows, widths=widths))
+
+RANK_DELTA_HEADERS = ['RANK', 'USERNAME', 'AC', 'RANK CHANGE', 'AC CHANGE', 'SINCE']
+RANK_DELTA_FIELDS = ['rank', 'userid', 'username', 'ac', 'rank_delta', 'ac_delta', 'since']
+
+def snapshot_time(taken, fmt='%Y-%m-%d %H:%M'):
+    return datetime.datetime.utcfromtimestamp(taken).strftime(fmt)
+
+def rank_delta_record(row):
+    userid, rank, ac, username, baseline = row
+    if baseline is None:
+        return (rank, userid, username, ac, None, None, None)
+    taken, old_rank, old_ac = baseline
+    return (rank, userid, username, ac, old_rank - rank, ac - old_ac,
+            snapshot_time(taken, '%Y-%m-%dT%H:%M:%SZ'))
+
+def delta_cell(delta):
+    if delta is None:
+        return '-'
+    if delta == 0:
+        return '0'
+    return table_cell('%+d' % delta, 'green' if delta > 0 else 'red')
+
+def pretty_print_rank_deltas(rows, taken):
+    load_userid()
+    if machine_output():
+        write_records(RANK_DELTA_FIELDS, (rank_delta_record(row) for row in rows))
+        return
+
+    def rank_delta_cells(row):
+        rank, userid, username, ac, rank_delta, ac_delta, _ = rank_delta_record(row)
+        since = snapshot_time(row[4][0]) if row[4] else '-'
+        cells = [str(rank), username, str(ac)]
+        if userid == int(USER_ID):
+            cells = [table_cell(c, 'yellow', 'bold') for c in cells]
+        return cells + [delta_cell(rank_delta), delta_cell(ac_delta), since]
+
+    print(f'Latest ranklist snapshot from {snapshot_time(taken)} UTC')
+    write_lines(render_table(RANK_DELTA_HEADERS, (rank_delta_cells(row) for row in rows)))
+
+def pretty_print_check(result):
+    if result['compile_error'] is not None:
+        print(add_fg_color(VERDICT_STRINGS[30], VERDICT_COLORS[30]))
+        print(result['compile_error'].rstrip())
+        return
+    rows = ([name, table_cell(VERDICT_STRINGS[v], VERDICT_COLORS[v]), '%1.3f' % elapsed]
+            for name, v, elapsed in result['tests'])
+    write_lines(render_table(['TEST', 'VERDICT', 'TIME'], rows))
+
+def pretty_print_leaderboard(headers, rows):
+    def leaderboard_cells(rank, name, values):
+        cells = [str(rank), name] + [str(v) for v in values]
+        if is_own_username(name):
+            cells = [table_cell(c, 'yellow', 'bold') for c in cells]
+        return cells
+
+    write_lines(render_table(['RANK', 'USER'] + headers,
+                             (leaderboard_cells(i + 1, name, values)
+                              for i, (name, values) in enumerate(rows))))
+
+PROGRESS_FIELDS = ['volume', 'solved', 'total', 'percent']
+
+def progress_records(progress_data, volume):
+    global PROBLEM_VOLUMES
 
-    print(bottom_div)
-    print('\n')
+    volumes = [volume] if volume else list(progress_data)
+    for v in volumes:
+        yield (v, progress_data[v], PROBLEM_VOLUMES[v], (progress_data[v] * 100) // PROBLEM_VOLUMES[v])
 
 def pretty_print_progress(progress_data, volume):
     global PROBLEM_VOLUMES
@@ -570,6 +1492,47 @@ def pretty_print_stats(sub_data, lan_data):
         bottom = '\u255A' + ('\u2550' * 81) + '\u255D'
         print(bottom)
         print('\n')
+
+def pretty_print_monthly(month_data):
+    rows = ([month, str(count)] for month, count in month_data.items())
+    write_lines(render_table(['MONTH', 'SUBMISSIONS'], rows))
+
+def pretty_print_volume_ratio(volume_data):
+    rows = list()
+    for volume, (accepted, total) in volume_data.items():
+        ratio = (accepted * 100) // total
+        color = 'green' if ratio >= 50 else 'yellow' if ratio >= 25 else 'red'
+        rows.append([str(volume), str(total), str(accepted), table_cell('%d%%' % ratio, color)])
+    write_lines(render_table(['VOLUME', 'SUBMISSIONS', 'ACCEPTED', 'AC RATIO'], rows))
+
+def pretty_print_runtimes(runtime_data):
+    if not runtime_data:
+        print('No accepted submissions.')
+        return
+    rows = (['P%d' % p if p < 100 else 'MAX', '%1.3f' % (rt / 1000.0)]
+            for p, rt in runtime_data.items())
+    write_lines(render_table(['PERCENTILE', 'RUNTIME'], rows))
+
+STATS_FIELDS = ['section', 'key', 'value', 'total']
+
+def stats_records(table, submissions=True, languages=True, months=False, volumes=False,
+                  runtimes=False):
+    if submissions:
+        for ver, count in table.histogram('verdict').most_common():
+            yield ('verdicts', VERDICT_STRINGS[ver], count, len(table))
+    if languages:
+        for lan, count in table.histogram('language').most_common():
+            yield ('languages', LANGUAGE_STRINGS[lan], count, len(table))
+    if months:
+        for month, count in table.monthly_volume().items():
+            yield ('months', month, count, None)
+    if volumes:
+        load_catalog()
+        for volume, (accepted, total) in volume_ratio(table).items():
+            yield ('volumes', volume, accepted, total)
+    if runtimes:
+        for p, rt in table.runtime_percentiles().items():
+            yield ('runtimes', 'p%d' % p if p < 100 else 'max', rt / 1000.0, None)
 # ------------------------------------------------------------------------
 
 
@@ -577,14 +1540,29 @@ def pretty_print_stats(sub_data, lan_data):
 # ------------------------------------------------------------------------
 # Submit Command
 # ------------------------------------------------------------------------
+@requires('catalog', 'session')
 def submit_a(args):
+    if args.batch:
+        if args.files or args.problem or args.wait:
+            print('-b/--batch cannot be used with files, -p/--problem or -w/--wait!')
+            sys.exit(1)
+        try:
+            rate_limit = load_config().getfloat('submit', 'rate_limit', fallback=SUBMIT_RATE_LIMIT)
+        except ConfigError as exc:
+            print(exc)
+            sys.exit(1)
+        if args.rate_limit is not None:
+            rate_limit = args.rate_limit
+        submit_batch(args.batch, language=args.language, rate_limit=rate_limit,
+                     check=args.check, samples=args.samples or args.batch)
+        return
+
+    if not args.files:
+        print('No solution files given!')
+        sys.exit(1)
+
+    problem, language = guess_problem_language(args.files[0])
     filename, ext = os.path.splitext(os.path.basename(args.files[0]))
-    language = LANGUAGE_GUESS.get(ext, None)
-    problem = None
-    try:
-        problem = int(filename)
-    except ValueError:
-        pass
 
     if args.problem:
         problem = args.problem
@@ -607,35 +1585,32 @@ extension "%s"''' % (ext,))
     langnum = LANGUAGE_VALUES[language]
     files = list(set(args.files))
 
-    submit(problem, langnum, files)
+    samples = args.samples or os.path.dirname(files[0]) or '.'
+    submit(problem, langnum, files, wait=args.wait, check=args.check, samples=samples)
 
-def submit(problem, language, files):
-    global CFG
-    global SESSION
+def guess_problem_language(path):
+    filename, ext = os.path.splitext(os.path.basename(path))
+    language = LANGUAGE_GUESS.get(ext, None)
+    problem = None
+    try:
+        problem = int(filename)
+    except ValueError:
+        pass
+    return problem, language
 
-    ptitle = PROBLEM_DATA[PNUM_TO_PID[problem]][2]
-    print('\n')
-    print(f'Submitting solution for problem {problem} - {ptitle}...')
-    print('Submit solution? (y/N)?')
-    if sys.stdin.readline().upper()[:-1] != 'Y':
-        print('Submission aborted. Exiting.')
-        sys.exit(1)
+def login_or_exit():
+    import requests
 
     try:
-        login_reply = login_from_config(CFG)
-    except ConfigError as exc:
+        return load_session()
+    except (ConfigError, LoginError) as exc:
         print(exc)
         sys.exit(1)
     except requests.exceptions.RequestException as err:
         print('Login connection failed:', err)
         sys.exit(1)
 
-    plain_result = login_reply.content.decode('utf-8').replace('<br />', '\n')
-    if not 'Logout' in plain_result:
-        print('Login failed!')
-        sys.exit(1)
-
-    submit_url = 'https://onlinejudge.org/index.php?option=com_onlinejudge&Itemid=25&page=save_submission'
+def upload_solution(session, problem, language, files):
     data = {'submit': 'true',
             'language': language,
             'localid': problem}
@@ -648,17 +1623,315 @@ def submit(problem, language, files):
                                code.read(),
                                'application/octet-stream')))
 
+    result = session.post(SUBMIT_URL, data=data, files=codeupl, headers=_HEADERS,
+                          timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    plain_result = result.content.decode('utf-8').replace('<br />', '\n')
+    return not 'You need to login' in plain_result
+
+def submit(problem, language, files, wait=False, check=False, samples='.'):
+    global LAST_SYNC
+    import requests
+
+    pid = problem_to_pid(problem)
+    ptitle = PROBLEM_DATA[pid][2]
+    if check:
+        preflight_or_exit(problem, language, files, samples)
+    print('\n')
+    print(f'Submitting solution for problem {problem} - {ptitle}...')
+    print('Submit solution? (y/N)?')
+    if sys.stdin.readline().upper()[:-1] != 'Y':
+        print('Submission aborted. Exiting.')
+        sys.exit(1)
+
+    session = login_or_exit()
+    last_sid = latest_submission_id() if wait else None
+
     try:
-        result = SESSION.post(submit_url, data=data, files=codeupl, headers=_HEADERS)
+        submitted = upload_solution(session, problem, language, files)
     except requests.exceptions.RequestException as err:
         print('Submit connection failed:', err)
         sys.exit(1)
 
-    plain_result = result.content.decode('utf-8').replace('<br />', '\n')
-    if 'You need to login' in plain_result:
+    if not submitted:
+        forget_session()
         print('Submission failed!')
+        if wait:
+            sys.exit(1)
     else:
         print(f'Successfully submitted solution for problem {problem} - {ptitle}.')
+        # The new submission is not in the store yet, so the next read syncs
+        LAST_SYNC = None
+        notify_daemon_submitted()
+        if wait:
+            watch_verdict(problem=problem, after_sid=last_sid)
+
+def submit_batch(directory, language=None, rate_limit=SUBMIT_RATE_LIMIT, check=False, samples=None):
+    import requests
+    load_catalog()
+
+    if not os.path.isdir(directory):
+        print(f'"{directory}" is not a directory!')
+        sys.exit(1)
+
+    jobs = list()
+    results = list()
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        problem, guessed = guess_problem_language(path)
+        lang = language if language else guessed
+        if problem is None or lang is None:
+            continue
+        if not catalog_has(pnums=[problem]):
+            results.append((name, problem, 'Unknown problem'))
+            continue
+        jobs.append((name, path, problem, LANGUAGE_VALUES[lang]))
+
+    if not jobs:
+        print(f'No solutions found in "{directory}".')
+        sys.exit(1)
+
+    if check:
+        # Solutions failing their local check are left out of the upload
+        checked = list()
+        for job in jobs:
+            name, path, problem, langnum = job
+            status = preflight_status(problem, langnum, [path], samples or directory)
+            print(f'{name}: {status}')
+            if status.startswith('Passed'):
+                checked.append(job)
+            else:
+                results.append((name, problem, f'Check failed: {status}'))
+        jobs = checked
+        if not jobs:
+            print_batch_summary(results)
+            sys.exit(1)
+
+    print('\n')
+    for name, path, problem, langnum in jobs:
+        ptitle = PROBLEM_DATA[PNUM_TO_PID[problem]][2]
+        print(f'{name}: problem {problem} - {ptitle} ({LANGUAGE_STRINGS[langnum]})')
+    print(f'Submit {len(jobs)} solutions (y/N)?')
+    if sys.stdin.readline().upper()[:-1] != 'Y':
+        print('Submission aborted. Exiting.')
+        sys.exit(1)
+
+    session = login_or_exit()
+    limiter = RateLimiter(rate_limit)
+    for name, path, problem, langnum in jobs:
+        limiter.wait()
+        try:
+            submitted = upload_solution(session, problem, langnum, [path])
+            status = 'Submitted' if submitted else 'Failed'
+            if not submitted:
+                forget_session()
+        except requests.exceptions.RequestException as err:
+            status = f'Connection failed: {err}'
+        print(f'{name}: {status}')
+        results.append((name, problem, status))
+
+    if any(status == 'Submitted' for _, _, status in results):
+        notify_daemon_submitted()
+    print_batch_summary(results)
+    if any(status != 'Submitted' for _, _, status in results):
+        sys.exit(1)
+
+def print_batch_summary(results):
+    rows = ([name, str(problem),
+             table_cell(status, 'green' if status == 'Submitted' else 'red')]
+            for name, problem, status in results)
+    write_lines(render_table(['FILE', 'PROBLEM', 'STATUS'], rows))
+    submitted = sum(1 for _, _, status in results if status == 'Submitted')
+    print(f'{submitted} of {len(results)} solutions submitted.')
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Local pre-flight checks
+# ------------------------------------------------------------------------
+def find_samples(problem, directory):
+    # Sample pairs are <problem>.in/.out, or <problem>-<n>.in/.out and the
+    # like, next to the solution or in the given directory
+    prefix = str(problem)
+    tests = list()
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return tests
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext != '.in' or not stem.startswith(prefix):
+            continue
+        if stem != prefix and stem[len(prefix)] not in '-_.':
+            continue
+        expected = os.path.join(directory, stem + '.out')
+        if os.path.isfile(expected):
+            tests.append((os.path.join(directory, name), expected))
+    return tests
+
+def check_cache_key(language, files, tests, time_limit, memory_limit):
+    import hashlib
+
+    digest = hashlib.sha256(repr((CHECK_CACHE_FORMAT, LANGUAGE_TOOLCHAINS[language], CHECK_MEMORY_ERRORS, time_limit, memory_limit)).encode())
+    for path in list(files) + [p for test in tests for p in test]:
+        digest.update(os.path.basename(path).encode() + b'\0')
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def check_solution(problem, language, files, samples_dir):
+    # Returns the check result and whether it came from the cache, or None
+    # without sample tests
+    tests = find_samples(problem, samples_dir)
+    if not tests:
+        return None, False
+    time_limit = load_config().getfloat('check', 'time_limit', fallback=CHECK_TIME_LIMIT)
+    memory_limit = load_config().getint('check', 'memory_limit', fallback=CHECK_MEMORY_LIMIT)
+
+    key = check_cache_key(language, files, tests, time_limit, memory_limit)
+    cache = read_cache('checks.pickle') or dict()
+    if key in cache:
+        return cache[key], True
+
+    with profile_phase('check'):
+        result = run_checks(language, files, tests, time_limit, memory_limit)
+    cache[key] = result
+    while len(cache) > CHECK_CACHE_ENTRIES:
+        cache.pop(next(iter(cache)))
+    try:
+        write_cache('checks.pickle', cache)
+    except OSError:
+        pass
+    return result, False
+
+def run_checks(language, files, tests, time_limit, memory_limit):
+    import concurrent.futures
+    import subprocess
+    import tempfile
+
+    compile_command, run_command, limit_memory = LANGUAGE_TOOLCHAINS[language]
+    with tempfile.TemporaryDirectory(prefix='ojcli-check-') as build:
+        def expand(command):
+            args = list()
+            for arg in command:
+                if arg == '{src}':
+                    args.extend(os.path.abspath(f) for f in files)
+                else:
+                    args.append(arg.format(exe=os.path.join(build, 'solution'), build=build,
+                                           memory=memory_limit))
+            return args
+
+        if compile_command:
+            try:
+                compiled = subprocess.run(expand(compile_command), capture_output=True, text=True,
+                                          errors='replace', timeout=CHECK_COMPILE_TIMEOUT)
+            except FileNotFoundError:
+                raise CheckError(f'{compile_command[0]} is not installed, cannot check '
+                                 f'{LANGUAGE_STRINGS[language]} solutions.')
+            except subprocess.TimeoutExpired:
+                raise CheckError(f'Compilation took longer than {CHECK_COMPILE_TIMEOUT} seconds.')
+            if compiled.returncode != 0:
+                return {'compile_error': compiled.stderr + compiled.stdout, 'tests': list()}
+
+        # Every sample runs in its own worker process under its own limits
+        command = expand(run_command)
+        workers = min(len(tests), os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_check_test, command, stdin_path, expected_path, time_limit,
+                                   memory_limit if limit_memory else None)
+                       for stdin_path, expected_path in tests]
+            try:
+                outcomes = [future.result() for future in futures]
+            except FileNotFoundError:
+                raise CheckError(f'{command[0]} is not installed, cannot check '
+                                 f'{LANGUAGE_STRINGS[language]} solutions.')
+    return {'compile_error': None,
+            'tests': [(os.path.basename(stdin_path), verdict, elapsed)
+                      for (stdin_path, _), (verdict, elapsed) in zip(tests, outcomes)]}
+
+def limit_check_resources(time_limit, memory_limit):
+    import resource
+
+    cpu = int(time_limit) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+    if memory_limit:
+        size = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+
+def run_check_test(command, stdin_path, expected_path, time_limit, memory_limit):
+    # Runs in a pool worker. Returns a verdict code and the wall time.
+    import signal
+    import subprocess
+
+    start = time.monotonic()
+    try:
+        with open(stdin_path, 'rb') as stdin:
+            result = subprocess.run(command, stdin=stdin, capture_output=True, timeout=time_limit,
+                                    preexec_fn=lambda: limit_check_resources(time_limit, memory_limit))
+    except subprocess.TimeoutExpired:
+        return 50, time_limit
+    elapsed = time.monotonic() - start
+    if result.returncode == -signal.SIGXCPU:
+        return 50, elapsed
+    if result.returncode != 0:
+        # Java is bounded by -Xmx instead of RLIMIT_AS, so memory_limit is
+        # None there and the markers are checked regardless
+        if any(e in result.stderr or e in result.stdout for e in CHECK_MEMORY_ERRORS):
+            return 60, elapsed
+        return 40, elapsed
+    with open(expected_path, 'rb') as f:
+        expected = f.read()
+    return compare_output(result.stdout, expected), elapsed
+
+def compare_output(actual, expected):
+    # Trailing whitespace at the very end does not count, any other
+    # whitespace difference is a presentation error like on the judge
+    actual = actual.replace(b'\r\n', b'\n')
+    expected = expected.replace(b'\r\n', b'\n')
+    if actual.rstrip() == expected.rstrip():
+        return 90
+    if actual.split() == expected.split():
+        return 80
+    return 70
+
+def check_passed(result):
+    return result['compile_error'] is None and all(v == 90 for _, v, _ in result['tests'])
+
+def preflight_status(problem, language, files, samples_dir):
+    try:
+        result, _ = check_solution(problem, language, files, samples_dir)
+    except CheckError as exc:
+        return str(exc)
+    if result is None:
+        return 'No sample tests found'
+    if result['compile_error'] is not None:
+        return VERDICT_STRINGS[30]
+    for name, verdict, _ in result['tests']:
+        if verdict != 90:
+            return f'{VERDICT_STRINGS[verdict]} on {name}'
+    return f'Passed {len(result["tests"])} sample tests'
+
+def preflight_or_exit(problem, language, files, samples_dir):
+    try:
+        result, cached = check_solution(problem, language, files, samples_dir)
+    except CheckError as exc:
+        print(exc)
+        sys.exit(1)
+    if result is None:
+        print(f'No sample tests for problem {problem} found in "{samples_dir}".')
+        print(f'Expected pairs like {problem}.in and {problem}.out, or {problem}-1.in and {problem}-1.out.')
+        sys.exit(1)
+
+    if cached:
+        print('Unchanged source and samples, using the previous check result.')
+    pretty_print_check(result)
+    if not check_passed(result):
+        print('Local check failed, not submitting.')
+        sys.exit(1)
+    print(f'All {len(result["tests"])} sample tests passed.')
 # ------------------------------------------------------------------------
 
 
@@ -666,38 +1939,116 @@ def submit(problem, language, files):
 # ------------------------------------------------------------------------
 # Verdict Command
 # ------------------------------------------------------------------------
+@requires('catalog', 'userid')
 def verdict_a(args):
     problem = args.problem if args.problem else None
     if args.all:
         limit = None
     else:
         limit = args.limit if args.limit else 25
-    verdict(problem=problem, limit=limit)
-
-def get_verdicts(problem=None, limit=None):
-    global USER_ID
-    if not problem:
-        if not limit:
-            verdict_api = f'/subs-user/{USER_ID}'
-        else:
-            verdict_api = f'/subs-user-last/{USER_ID}/{limit}'
+    if args.watch:
+        watch_verdict(problem=problem)
     else:
-        verdict_api = f'/subs-nums/{USER_ID}/{problem}/0'
+        verdict(problem=problem, limit=limit)
 
-    full_api = BASE_URL + verdict_api
-    response = requests.get(full_api)
-    return response.json()
+def sync_own_submissions(max_age=0):
+    global LAST_SYNC
 
-def verdict(problem=None, limit=None):
-    global USER_ID
+    if LAST_SYNC is not None and time.monotonic() - LAST_SYNC < max_age:
+        return 0
+    load_userid()
+    uname = load_config().get('user', 'username')
+    try:
+        count = sync_submissions(USER_ID, uname=uname)
+    except StaleUserIdError:
+        revalidate_userid()
+        count = sync_submissions(USER_ID, uname=uname)
+    LAST_SYNC = time.monotonic()
+    return count
+
+def problem_to_pid(problem):
+    if not catalog_has(pnums=[problem]):
+        print(f'Unknown problem {problem}!')
+        sys.exit(1)
+    return PNUM_TO_PID[problem]
 
+def latest_submission_id():
+    sync_own_submissions()
+    rows = query_submissions(USER_ID, limit=1)
+    return rows[0][0] if rows else 0
+
+def get_verdicts(problem=None, limit=None):
+    pid = problem_to_pid(problem) if problem else None
+    sync_own_submissions(max_age=SYNC_MAX_AGE)
+    return iter_submissions(USER_ID, pid=pid, limit=limit)
+
+def verdict_widths(pid=None, limit=None):
+    # Column widths come from the distinct values in the store, so the
+    # table can be streamed without holding every row in memory
+    def distinct(column):
+        return distinct_submission_values(USER_ID, column, pid=pid, limit=limit)
+
+    pids = distinct('pid')
+    if not pids:
+        return None
+    problems = [str(PROBLEM_DATA[p][1]) + ' ' + str(PROBLEM_DATA[p][2]) for p in pids]
+    ranks = [str(r) if r > 0 else '-' for r in distinct('rank')]
+    cells = [problems,
+             [VERDICT_STRINGS[v] for v in distinct('verdict')],
+             [LANGUAGE_STRINGS[l] for l in distinct('language')],
+             ['%1.3f' % (int(max(distinct('runtime'))) / 1000.0)],
+             ranks,
+             ['0000-00-00 00:00:00']]
+    return [max([len(header)] + [display_len(c) for c in column])
+            for header, column in zip(VERDICT_HEADERS, cells)]
+
+def wait_for_verdict(pid=None, after_sid=None, timeout=WATCH_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    interval = WATCH_MIN_INTERVAL
+    seen = None
+    while True:
+        sync_own_submissions()
+        rows = query_submissions(USER_ID, pid=pid, limit=1)
+        if rows and (after_sid is None or rows[0][0] > after_sid):
+            row = rows[0]
+            if row[2] not in PENDING_VERDICTS:
+                return row
+            if seen != row[0]:
+                # Poll quickly again once the submission shows up in the queue
+                seen = row[0]
+                interval = WATCH_MIN_INTERVAL
+                print(f'Submission {row[0]} is in the judge queue, waiting for verdict...',
+                      file=status_stream())
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 1.5, WATCH_MAX_INTERVAL)
+
+def watch_verdict(problem=None, after_sid=None):
+    pid = problem_to_pid(problem) if problem else None
+    row = wait_for_verdict(pid=pid, after_sid=after_sid)
+    if row is None:
+        print('Timed out waiting for a verdict.', file=status_stream())
+        sys.exit(2)
+    require_pids([row[1]])
+    pretty_print_verdict([row])
+    sys.exit(0 if row[2] == 90 else 1)
+
+def verdict(problem=None, limit=None):
     vdata = get_verdicts(problem=problem, limit=limit)
-    if USER_ID in vdata:
-        vdata = vdata[USER_ID]
-    vdata = list(reversed(vdata['subs']))
-    if limit:
-        vdata = vdata[:limit]
-    pretty_print_verdict(vdata)
+    pid = PNUM_TO_PID[problem] if problem else None
+    require_pids(distinct_submission_values(USER_ID, 'pid', pid=pid, limit=limit))
+    if machine_output():
+        # Records go out as the store yields them, nothing is measured first
+        pretty_print_verdict(vdata)
+        return
+    widths = verdict_widths(pid=pid, limit=limit)
+    if widths is None:
+        print('No submissions found.')
+        return
+    pretty_print_verdict(vdata, widths=widths)
 # ------------------------------------------------------------------------
 
 
@@ -705,7 +2056,14 @@ def verdict(problem=None, limit=None):
 # ------------------------------------------------------------------------
 # Rank Command
 # ------------------------------------------------------------------------
+@requires('userid')
 def rank_a(args):
+    if args.since is not None:
+        if args.surround or args.above or args.below or args.next:
+            print('--since cannot be used with -a/--above, -b/--below, -C/--surround or -n/--next!')
+            sys.exit(1)
+        rank_since(args.since)
+        return
     if args.surround and (args.above or args.below):
         print('-C/--surround cannot be used with -a/--above or -b/--below!')
         sys.exit(1)
@@ -718,28 +2076,112 @@ def rank_a(args):
     _next = args.next if args.next else 0
     rank(above=above, below=below, _next=_next)
 
+def get_ranklist(uid, above, below):
+    rank_api = f'/ranklist/{uid}/{above}/{below}'
+    response = api_get(rank_api)
+    return response.json()
+
+def get_rank_chunk(pos, count):
+    response = api_get(f'/rank/{pos}/{count}')
+    return response.json()
+
+def rank_spans(start, end):
+    return [(pos, min(RANK_CHUNK_SIZE, end - pos + 1))
+            for pos in range(start, end + 1, RANK_CHUNK_SIZE)]
+
+def stream_rank_chunks(parts):
+    # parts are rows already fetched or (pos, count) spans, in rank order.
+    # The spans are fetched concurrently and yielded in order.
+    import concurrent.futures
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = [part if isinstance(part, list) else pool.submit(get_rank_chunk, *part)
+                   for part in parts]
+        try:
+            for future in futures:
+                yield future if isinstance(future, list) else future.result()
+        finally:
+            for future in futures:
+                if not isinstance(future, list):
+                    future.cancel()
+
 def rank(above=0, below=0, _next=0):
-    global USER_ID
+    load_userid()
+    # Large windows start with one chunk around the user. The rest is
+    # fetched by position once the user's rank is known.
+    near_above = min(above, RANK_CHUNK_SIZE)
+    near_below = min(below, RANK_CHUNK_SIZE)
+    next_window = 0 < _next <= RANK_CHUNK_SIZE
+
+    def fetch_windows():
+        windows = [lambda: get_ranklist(USER_ID, near_above, near_below)]
+        if next_window:
+            windows.append(lambda: get_ranklist(USER_ID, _next, 0))
+        return fan_out(*windows)
+
+    windows = fetch_windows()
+    if not any(r['userid'] == int(USER_ID) and is_own_username(r['username']) for r in windows[0]):
+        revalidate_userid()
+        windows = fetch_windows()
+    rdata = windows[0]
+    own = next((r for r in rdata if r['userid'] == int(USER_ID)), None)
+    if own is None:
+        print('Could not find your user in the ranklist.')
+        sys.exit(1)
 
-    rank_api = f'/ranklist/{USER_ID}/{above}/{below}'
-    full_url = BASE_URL + rank_api
-    response = requests.get(full_url)
-    rdata = response.json()
+    parts = [rdata]
+    if above > near_above and rdata[0]['rank'] > 1:
+        parts = rank_spans(max(1, own['rank'] - above), rdata[0]['rank'] - 1) + parts
+    if below > near_below and rdata[-1]['rank'] == own['rank'] + near_below:
+        parts += rank_spans(rdata[-1]['rank'] + 1, own['rank'] + below)
+
+    if len(parts) > 1:
+        pretty_print_rank(stream_rank_chunks(parts), measured=rdata,
+                          last_rank=own['rank'] + below)
+    else:
+        pretty_print_rank(parts, measured=rdata)
+    # Only the chunk around the user is snapshotted, wide windows would
+    # otherwise store thousands of rows per call
+    snapshot = list(rdata)
+    if next_window:
+        snapshot.extend(windows[1])
+    elif _next > 0:
+        windows.append(get_rank_chunk(max(1, own['rank'] - _next), 1) + [own])
+    save_rank_snapshot(snapshot)
 
     if _next > 0:
-        rank_api = f'/ranklist/{USER_ID}/{_next}/0'
-        full_url = BASE_URL + rank_api
-        response = requests.get(full_url)
-        data = response.json()
+        data = windows[1]
         acs_needed = data[0]['ac'] - data[-1]['ac']
         desired_rank = data[0]['rank']
+        if machine_output():
+            print(f'Need {acs_needed} more accepted solutions to reach rank {desired_rank}.',
+                  file=status_stream())
+            return
         line = 'Need '
         line += add_fg_color(f'{acs_needed}', 'green')
         line += f' more accepted solutions to reach rank {desired_rank}.\n'
-        pretty_print_rank(rdata)
         print(line)
-    else:
-        pretty_print_rank(rdata)
+
+def parse_since(value):
+    # A UTC date or a number of days back, e.g. 2024-01-31 or 7d
+    if value.endswith('d') and value[:-1].isdigit():
+        return int(time.time()) - int(value[:-1]) * 86400
+    try:
+        date = datetime.datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected YYYY-MM-DD or a number of days like 7d, got {value!r}')
+    return int(date.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def rank_since(since):
+    load_userid()
+    # Only the local snapshots are read, this makes no API calls
+    with contextlib.closing(open_rank_store()) as conn:
+        taken, window = latest_rank_window(conn, int(USER_ID))
+        if taken is None:
+            print('No ranklist snapshots yet, run rank first.')
+            sys.exit(1)
+        rows = [(userid, rank, ac, username, rank_baseline(conn, userid, since, taken))
+                for userid, rank, ac, username in window]
+    pretty_print_rank_deltas(rows, taken)
 # ------------------------------------------------------------------------
 
 
@@ -747,35 +2189,137 @@ def rank(above=0, below=0, _next=0):
 # ------------------------------------------------------------------------
 # Random Command
 # ------------------------------------------------------------------------
+@requires('catalog')
 def random_prb_a(args):
     volume = args.volume if args.volume else None
-    random_prb(volume=volume)
-
-def random_prb(volume=None):
+    random_prb(volume=volume, unsolved=args.unsolved)
+
+def solved_problems(uid=None):
+    load_catalog()
+    if uid is None:
+        sync_own_submissions(max_age=SYNC_MAX_AGE)
+        uid = USER_ID
+    pids = accepted_pids(uid)
+    catalog_has(pids=pids)
+    return set(PID_TO_PNUM[pid] for pid in pids if pid in PID_TO_PNUM)
+
+def random_prb(volume=None, unsolved=False):
     global PROBLEM_VOLUMES
+    global PROBLEM_VOLUME_INDEX
+    load_catalog()
 
-    if not volume:
-        volume = random.choice(list(PROBLEM_VOLUMES.keys()))
-    if volume not in PROBLEM_VOLUMES.keys():
+    if volume and volume not in PROBLEM_VOLUMES.keys():
         print("Invalid volume selection!")
         sys.exit(1)
 
-    problem_num = random.randint(0, PROBLEM_VOLUMES[volume]-1)
-    problem_vol_num = volume * 100 + problem_num
-
-    problem_api = f'/p/num/{problem_vol_num}'
-    full_api = BASE_URL + problem_api
+    if unsolved:
+        solved = solved_problems()
+        volumes = [volume] if volume else PROBLEM_VOLUME_INDEX.keys()
+        candidates = [n for v in volumes for n in PROBLEM_VOLUME_INDEX[v] if n not in solved]
+        if not candidates:
+            print('No unsolved problems left!')
+            sys.exit(1)
+    else:
+        if not volume:
+            volume = random.choice(list(PROBLEM_VOLUMES.keys()))
+        candidates = PROBLEM_VOLUME_INDEX[volume]
 
-    response = requests.get(full_api)
-    response_json = response.json()
-    num = response_json['num']
-    title = response_json['title']
+    num = random.choice(candidates)
+    title = PROBLEM_DATA[PNUM_TO_PID[num]][2]
 
     print(f'Selected problem {num} - {title}')
     print('Open in browser (y/N)?')
     if sys.stdin.readline().upper()[:-1] == 'Y':
-        problem_url = f'https://onlinejudge.org/external/{volume}/{problem_vol_num}.pdf'
-        webbrowser.open(problem_url)
+        try:
+            view_statement(num)
+        finally:
+            evict_statements(statement_cache_limit())
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Open Command
+# ------------------------------------------------------------------------
+@requires('catalog')
+def open_a(args):
+    if args.problem is None and not (args.prefetch and args.volume):
+        print('Give a problem to open, or a volume and --prefetch.')
+        sys.exit(1)
+    open_statement(problem=args.problem, volume=args.volume,
+                   prefetch=args.prefetch or 0, browser=not args.no_browser)
+
+def view_statement(num):
+    # Opens the cached copy; without one and without a connection the
+    # browser still gets the judge's URL
+    import webbrowser
+    try:
+        path = fetch_statement(num)
+    except Exception as exc:
+        if not (isinstance(exc, StatementError) or is_request_error(exc)):
+            raise
+        print(exc, file=sys.stderr)
+        webbrowser.open(statement_url(num))
+        return
+    import pathlib
+    webbrowser.open(pathlib.Path(path).as_uri())
+
+def prefetch_candidates(volume, count, after=None):
+    # The next count unsolved problems of the volume after the given one,
+    # wrapping around at the end of the volume
+    global PROBLEM_VOLUME_INDEX
+
+    solved = solved_problems()
+    nums = sorted(PROBLEM_VOLUME_INDEX[volume])
+    start = nums.index(after) + 1 if after in nums else 0
+    nums = nums[start:] + nums[:start]
+    return [n for n in nums if n != after and n not in solved][:count]
+
+def prefetch_statements(nums):
+    def fetch(num):
+        try:
+            fetch_statement(num)
+        except Exception as exc:
+            if not (isinstance(exc, StatementError) or is_request_error(exc)):
+                raise
+            return f'Skipping {num}: {exc}'
+        return None
+
+    missing = [n for n in nums if not os.path.exists(statement_path(n))]
+    if not missing:
+        return 0, len(nums)
+    errors = [e for e in fan_out(*[lambda n=n: fetch(n) for n in missing]) if e]
+    for error in errors:
+        print(error, file=sys.stderr)
+    return len(missing) - len(errors), len(nums) - len(missing)
+
+def open_statement(problem=None, volume=None, prefetch=0, browser=True):
+    global PROBLEM_DATA
+    global PNUM_TO_PID
+
+    if problem is not None:
+        problem_to_pid(problem)
+        if volume is None:
+            volume = problem // 100
+    check_volume(volume)
+
+    try:
+        if problem is not None:
+            title = PROBLEM_DATA[PNUM_TO_PID[problem]][2]
+            if browser:
+                print(f'Opening problem {problem} - {title}')
+                view_statement(problem)
+            else:
+                print(fetch_statement(problem))
+
+        # The requested statement is shown first, the prefetch runs while
+        # it is being read
+        if prefetch:
+            nums = prefetch_candidates(volume, prefetch, after=problem)
+            fetched, cached = prefetch_statements(nums)
+            print(f'Prefetched {fetched} statements, {cached} already cached.', file=sys.stderr)
+    finally:
+        evict_statements(statement_cache_limit())
 # ------------------------------------------------------------------------
 
 
@@ -783,20 +2327,25 @@ def random_prb(volume=None):
 # ------------------------------------------------------------------------
 # Progress Command
 # ------------------------------------------------------------------------
+@requires('catalog', 'userid')
 def progress_a(args):
     volume = args.volume if args.volume else None
-    progress(volume=volume)
+    if args.users:
+        team_progress(read_users_file(args.users), volume=volume)
+    else:
+        progress(volume=volume)
 
-def progress(volume=None):
+def check_volume(volume):
+    global PROBLEM_VOLUMES
+    load_catalog()
+
+    if volume and volume not in PROBLEM_VOLUMES:
+        print("Invalid volume selection!")
+        sys.exit(1)
+
+def volume_progress(nums):
     global PROBLEM_VOLUMES
-    global PID_TO_PNUM
 
-    data = get_verdicts(problem=None, limit=None)
-    data = data['subs']
-    nums = set()
-    for i in range(len(data)):
-        if data[i][2] == 90:
-            nums.add(PID_TO_PNUM[data[i][1]])
     pdata = dict()
     for k in PROBLEM_VOLUMES.keys():
         pdata[k] = 0
@@ -804,7 +2353,14 @@ def progress(volume=None):
     for n in nums:
         idx = n // 100
         pdata[idx] += 1
+    return pdata
 
+def progress(volume=None):
+    check_volume(volume)
+    pdata = volume_progress(solved_problems())
+    if machine_output():
+        write_records(PROGRESS_FIELDS, progress_records(pdata, volume))
+        return
     pretty_print_progress(pdata, volume)
 # ------------------------------------------------------------------------
 
@@ -813,48 +2369,712 @@ def progress(volume=None):
 # ------------------------------------------------------------------------
 # Stats Command
 # ------------------------------------------------------------------------
+@requires('userid')
 def stats_a(args):
     submissions = args.submissions if args.submissions else False
     languages = args.languages if args.languages else False
-    if not submissions and not languages:
+    months = args.months if args.months else False
+    volumes = args.volumes if args.volumes else False
+    runtimes = args.runtimes if args.runtimes else False
+    if not (submissions or languages or months or volumes or runtimes):
         submissions = languages = True
-    stats(submissions=submissions, languages=languages)
+    sections = dict(submissions=submissions, languages=languages,
+                    months=months, volumes=volumes, runtimes=runtimes)
+    if args.users:
+        team_stats(read_users_file(args.users), **sections)
+    else:
+        stats(**sections)
 
-def stats(submissions=True, languages=True):
-    vdata = get_verdicts(problem=None, limit=None)
-    vdata = vdata['subs']
-    sdata = ldata = None
-    if submissions:
-        sdata = dict()
-        for i in range(len(vdata)):
-            ver = vdata[i][2]
-            if not ver in sdata:
-                sdata[ver] = 0
-            sdata[ver] += 1
-    if languages:
-        ldata = dict()
-        for i in range(len(vdata)):
-            lan = vdata[i][5]
-            if not lan in ldata:
-                ldata[lan] = 0
-            ldata[lan] += 1
-    pretty_print_stats(sdata, ldata)
+def stats(submissions=True, languages=True, months=False, volumes=False, runtimes=False):
+    table = SubmissionTable.from_rows(get_verdicts(problem=None, limit=None))
+    print_table_stats(table, submissions=submissions, languages=languages,
+                      months=months, volumes=volumes, runtimes=runtimes)
+
+def volume_ratio(table):
+    global PID_TO_PNUM
+
+    require_pids(table.histogram('pid'))
+    return table.volume_ac_ratio(PID_TO_PNUM)
+
+def print_table_stats(table, submissions=True, languages=True, months=False, volumes=False,
+                      runtimes=False):
+    if machine_output():
+        write_records(STATS_FIELDS, stats_records(table, submissions=submissions,
+                                                  languages=languages, months=months,
+                                                  volumes=volumes, runtimes=runtimes))
+        return
+    if not len(table):
+        print('No submissions found.')
+        return
+
+    sdata = dict(table.histogram('verdict')) if submissions else None
+    ldata = dict(table.histogram('language')) if languages else None
+    if sdata or ldata:
+        pretty_print_stats(sdata, ldata)
+    if months:
+        pretty_print_monthly(table.monthly_volume())
+    if volumes:
+        load_catalog()
+        pretty_print_volume_ratio(volume_ratio(table))
+    if runtimes:
+        pretty_print_runtimes(table.runtime_percentiles())
 # ------------------------------------------------------------------------
 
 
 
 # ------------------------------------------------------------------------
-# Main method
+# Team Dashboard
 # ------------------------------------------------------------------------
-def main():
+def read_users_file(path):
+    try:
+        with open(path) as f:
+            names = [line.split('#', 1)[0].strip() for line in f]
+    except OSError as exc:
+        print(f'Failed to read users file: {exc}')
+        sys.exit(1)
+    names = list(dict.fromkeys(n for n in names if n))
+    if not names:
+        print(f'No usernames found in {path}!')
+        sys.exit(1)
+    return names
+
+def sync_member(name, limiter):
+    # Returns the user id of a member with a synced store, or None when
+    # uHunt does not know the username
+    uid = get_userid(name, limiter=limiter)
+    if uid == '0':
+        return None
+    try:
+        sync_submissions(uid, uname=name, limiter=limiter)
+    except StaleUserIdError:
+        uid = get_userid(name, refresh=True, limiter=limiter)
+        if uid == '0':
+            return None
+        sync_submissions(uid, uname=name, limiter=limiter)
+    return uid
+
+def fetch_team(names, aggregate):
+    # Members are synced on the bounded fan_out pool and share one rate
+    # limiter. A member that cannot be fetched is skipped, not fatal.
+    limiter = RateLimiter(load_config().getfloat('team', 'rate_limit', fallback=TEAM_RATE_LIMIT))
+
+    def fetch(name):
+        try:
+            uid = sync_member(name, limiter)
+        except Exception as exc:
+            if not is_request_error(exc):
+                raise
+            return name, None, f'connection failed: {exc}'
+        if uid is None:
+            return name, None, 'unknown user'
+        return name, aggregate(uid), None
+
+    members = list()
+    for name, data, error in fan_out(*[lambda n=name: fetch(n) for name in names]):
+        if error:
+            print(f'Skipping {name}: {error}', file=sys.stderr)
+        else:
+            members.append((name, data))
+    if not members:
+        print('No team members could be fetched.')
+        sys.exit(1)
+    return members
+
+def team_progress(names, volume=None):
+    global PROBLEM_VOLUMES
+    check_volume(volume)
+
+    members = fetch_team(names, solved_problems)
+    if machine_output():
+        # One record per member and volume, dashboards aggregate themselves
+        write_records(['user'] + PROGRESS_FIELDS,
+                      ((name,) + record for name, nums in members
+                       for record in progress_records(volume_progress(nums), volume)))
+        return
+    if volume:
+        total = PROBLEM_VOLUMES[volume]
+        counts = [(name, volume_progress(nums)[volume]) for name, nums in members]
+    else:
+        total = sum(PROBLEM_VOLUMES.values())
+        counts = [(name, len(nums)) for name, nums in members]
+    counts.sort(key=lambda c: (-c[1], c[0].lower()))
+    pretty_print_leaderboard(['SOLVED', 'PROGRESS'],
+                             [(name, [solved, '%d%%' % ((solved * 100) // total)])
+                              for name, solved in counts])
+
+    # The team bars count problems solved by at least one member
+    team_solved = set().union(*(nums for _, nums in members))
+    pretty_print_progress(volume_progress(team_solved), volume)
+
+def team_stats(names, **sections):
+    members = fetch_team(names, lambda uid: SubmissionTable.from_rows(iter_submissions(uid)))
+    if machine_output():
+        write_records(['user'] + STATS_FIELDS,
+                      ((name,) + record for name, table in members
+                       for record in stats_records(table, **sections)))
+        return
+    combined = SubmissionTable()
+    rows = list()
+    for name, table in members:
+        accepted = table.histogram('verdict')[90]
+        ratio = '%d%%' % ((accepted * 100) // len(table)) if len(table) else '-'
+        rows.append((name, [len(table.accepted_pids()), len(table), accepted, ratio]))
+        combined.extend(table)
+    members.clear()
+
+    rows.sort(key=lambda r: (-r[1][0], r[1][1], r[0].lower()))
+    pretty_print_leaderboard(['SOLVED', 'SUBMISSIONS', 'ACCEPTED', 'AC RATIO'], rows)
+    print_table_stats(combined, **sections)
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Search Command
+# ------------------------------------------------------------------------
+@requires('catalog')
+def search_a(args):
+    limit = args.limit if args.limit else SEARCH_LIMIT
+    search(' '.join(args.query), limit=limit)
+
+def normalize_title(text):
+    import unicodedata
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(c if c.isalnum() else ' ' for c in text if not unicodedata.combining(c))
+
+def trigrams(text):
+    grams = set()
+    for word in normalize_title(text).split():
+        padded = f' {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i+3])
+    return grams
+
+def build_search_index():
+    postings = dict()
+    sizes = dict()
+    titles = dict()
+    for row in PROBLEM_DATA.values():
+        pnum = row[1]
+        grams = trigrams(row[2])
+        sizes[pnum] = len(grams)
+        titles[pnum] = ' '.join(normalize_title(row[2]).split())
+        for gram in grams:
+            postings.setdefault(gram, list()).append(pnum)
+    postings = {gram: array.array('l', pnums) for gram, pnums in postings.items()}
+    return {'stamp': CATALOG_STAMP, 'postings': postings, 'sizes': sizes, 'titles': titles}
+
+def load_search_index():
+    global CATALOG_STAMP
+    load_catalog()
+
+    index = read_cache('search-index.pickle')
+    if not isinstance(index, dict) or index.get('stamp') != CATALOG_STAMP:
+        index = build_search_index()
+        try:
+            write_cache('search-index.pickle', index)
+        except OSError:
+            pass
+    return index
+
+def search_problems(query, limit=SEARCH_LIMIT):
+    index = load_search_index()
+    grams = trigrams(query)
+    needle = ' '.join(normalize_title(query).split())
+
+    hits = collections.Counter()
+    for gram in grams:
+        hits.update(index['postings'].get(gram, ()))
+
+    # Jaccard similarity of the trigram sets, with a bonus for titles that
+    # contain the query verbatim and for an exact problem number
+    scores = dict()
+    for pnum, shared in hits.items():
+        score = shared / (len(grams) + index['sizes'][pnum] - shared)
+        if needle and needle in index['titles'][pnum]:
+            score += 0.5
+        scores[pnum] = score
+    if query.strip().isdigit() and int(query) in PNUM_TO_PID:
+        scores[int(query)] = 2.0
+
+    return [pnum for pnum, _ in sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:limit]]
+
+def local_solved_problems():
+    # Search works offline, so solved status only comes from the local
+    # submission store and is not synced first
+    try:
+        load_userid()
+        return set(PID_TO_PNUM[pid] for pid in accepted_pids(USER_ID) if pid in PID_TO_PNUM)
+    except ConfigError:
+        return set()
+    except Exception as exc:
+        import sqlite3
+        if is_request_error(exc) or isinstance(exc, sqlite3.Error):
+            return set()
+        raise
+
+def search(query, limit=SEARCH_LIMIT):
+    matches = search_problems(query, limit=limit)
+    if not matches:
+        print(f'No problems matching "{query}".')
+        return
+
+    solved = local_solved_problems()
+    rows = ([str(pnum), PROBLEM_DATA[PNUM_TO_PID[pnum]][2],
+             table_cell('yes', 'green') if pnum in solved else 'no']
+            for pnum in matches)
+    write_lines(render_table(['NUMBER', 'TITLE', 'SOLVED'], rows))
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Watch Command
+# ------------------------------------------------------------------------
+@requires('catalog', 'userid')
+def watch_a(args):
+    if not (sys.stdin.isatty() and sys.stdout.isatty()):
+        print('watch needs a terminal.')
+        sys.exit(1)
+    watch(interval=args.interval or DASHBOARD_IDLE_INTERVAL,
+          limit=args.limit or DASHBOARD_VERDICTS,
+          surround=args.surround if args.surround is not None else DASHBOARD_SURROUND)
+
+def fit_text(text, width):
+    if display_len(text) > width:
+        text = clip_text(text, width)
+    return text + ' ' * (width - display_len(text))
+
+def dashboard_poll(state, limit, surround):
+    # Returns whether anything shown on the dashboard changed. Only new or
+    # still pending submissions are fetched, and the rank window only when
+    # it can have moved.
+    old = (state['verdicts'], state['ranklist'], state['progress'])
+    sync_own_submissions()
+    state['verdicts'] = query_submissions(USER_ID, limit=limit)
+    catalog_has(pids=[row[1] for row in state['verdicts']])
+    solved = solved_problems(uid=USER_ID)
+    rank_age = time.monotonic() - state['rank_fetched']
+    if state['ranklist'] is None or len(solved) != state['solved'] or rank_age >= DASHBOARD_RANK_INTERVAL:
+        state['ranklist'] = get_ranklist(USER_ID, surround, surround)
+        state['rank_fetched'] = time.monotonic()
+        save_rank_snapshot(state['ranklist'])
+    if len(solved) != state['solved']:
+        state['solved'] = len(solved)
+        state['progress'] = volume_progress(solved)
+    return old != (state['verdicts'], state['ranklist'], state['progress'])
+
+def dashboard_lines(state, width):
+    # A line is a tuple of (text, color, bold) segments, so unchanged lines
+    # compare equal and are not drawn again
     global PROBLEM_DATA
-    global USER_ID
+    global PROBLEM_VOLUMES
+
+    lines = [((f'ojcli watch - {load_config().get("user", "username")}', None, True),), ()]
+
+    lines.append((('LATEST VERDICTS', None, True),))
+    for sid, pid, ver, runtime, submitted, lan, rank in state['verdicts']:
+        # Problems missing even from a revalidated catalog show their id
+        problem = f'{PROBLEM_DATA[pid][1]} {PROBLEM_DATA[pid][2]}' if pid in PROBLEM_DATA else f'? (id {pid})'
+        lines.append((('  %-10d' % sid, None, False),
+                      (fit_text(problem, 32) + ' ', None, False),
+                      (fit_text(VERDICT_STRINGS[ver], 20), VERDICT_COLORS[ver], ver == 90),
+                      (fit_text(LANGUAGE_STRINGS[lan], 9), LANGUAGE_COLORS[lan], False),
+                      ('%7.3f %6s  ' % (runtime / 1000.0, rank if rank > 0 else '-'), None, False),
+                      (datetime.datetime.utcfromtimestamp(submitted).strftime('%Y-%m-%d %H:%M'), None, False)))
+    if not state['verdicts']:
+        lines.append((('  No submissions yet.', None, False),))
+    lines.append(())
+
+    lines.append((('RANK', None, True),))
+    for r in state['ranklist'] or []:
+        own = r['userid'] == int(USER_ID)
+        lines.append((('  %7d  %s %7d AC %8d submissions' % (r['rank'], fit_text(r['username'], 20),
+                                                             r['ac'], r['nos']),
+                       'yellow' if own else None, own),))
+    lines.append(())
+
+    total = sum(PROBLEM_VOLUMES.values())
+    lines.append(((f'PROGRESS  {max(state["solved"], 0)}/{total} solved', None, True),))
+    cells = list()
+    for v in sorted(PROBLEM_VOLUMES):
+        p = (state['progress'].get(v, 0) * 100) // PROBLEM_VOLUMES[v]
+        bar = '\u2588' * (p // 10) + '\u00b7' * (10 - p // 10)
+        cells.append(('  %4d %s %3d%%' % (v, bar, p), 'green' if p == 100 else None, False))
+    per_line = max(1, width // 22)
+    for i in range(0, len(cells), per_line):
+        lines.append(tuple(cells[i:i + per_line]))
+    return lines
+
+def draw_dashboard(screen, lines, drawn, colors):
+    import curses
+
+    height, width = screen.getmaxyx()
+    # The status line stays on the bottom row of the screen
+    body = max(height - 1, 0)
+    lines = lines[:-1][:body] + [()] * (body - len(lines) + 1) + lines[-1:]
+    for y, line in enumerate(lines):
+        if y < len(drawn) and drawn[y] == line:
+            continue
+        screen.move(y, 0)
+        screen.clrtoeol()
+        x = 0
+        for text, color, bold in line:
+            if x >= width - 1:
+                break
+            attr = colors.get(color, 0) | (curses.A_BOLD if bold else 0)
+            screen.addnstr(y, x, text, width - 1 - x, attr)
+            x += display_len(text)
+    drawn[:] = lines
+    screen.refresh()
+
+def dashboard(screen, interval, limit, surround):
+    import curses
+
+    try:
+        curses.curs_set(0)
+    except curses.error:
+        pass
+    colors = dict()
+    if curses.has_colors():
+        curses.use_default_colors()
+        for i, name in enumerate(ANSI_FG_COLORS, start=1):
+            curses.init_pair(i, getattr(curses, 'COLOR_' + name.upper()), -1)
+            colors[name] = curses.color_pair(i)
+
+    state = {'verdicts': [], 'ranklist': None, 'progress': dict(), 'solved': -1, 'rank_fetched': 0}
+    drawn = list()
+    delay = DASHBOARD_MIN_INTERVAL
+    next_poll = 0
+    status = ''
+    while True:
+        if time.monotonic() >= next_poll:
+            try:
+                changed = dashboard_poll(state, limit, surround)
+                error = ''
+            except Exception as exc:
+                if not is_request_error(exc):
+                    raise
+                changed = False
+                error = 'Connection failed, showing the last data. '
+            if changed or has_pending_submissions(USER_ID):
+                delay = DASHBOARD_MIN_INTERVAL
+            else:
+                delay = min(delay * 2, interval)
+            next_poll = time.monotonic() + delay
+            status = (f'{error}Updated {time.strftime("%H:%M:%S")}, next poll in {delay:g}s. '
+                      'q quits, r refreshes.')
+
+        width = screen.getmaxyx()[1]
+        draw_dashboard(screen, dashboard_lines(state, width) + [((status, None, False),)], drawn, colors)
+
+        # Blocks until a key is pressed or the next poll is due
+        screen.timeout(max(0, int((next_poll - time.monotonic()) * 1000)))
+        key = screen.getch()
+        if key in (ord('q'), ord('Q')):
+            return
+        if key in (ord('r'), ord('R')):
+            next_poll = 0
+            delay = DASHBOARD_MIN_INTERVAL
+        elif key == curses.KEY_RESIZE:
+            screen.clear()
+            drawn.clear()
+
+def watch(interval=DASHBOARD_IDLE_INTERVAL, limit=DASHBOARD_VERDICTS, surround=DASHBOARD_SURROUND):
+    import curses
+    load_catalog()
+    load_userid()
+    try:
+        curses.wrapper(dashboard, interval, limit, surround)
+    except KeyboardInterrupt:
+        pass
+# ------------------------------------------------------------------------
+
+
+
+# ------------------------------------------------------------------------
+# Daemon Command
+# ------------------------------------------------------------------------
+@requires()
+def daemon_a(args):
+    if args.stop:
+        stop_daemon()
+        return
+    interval = args.interval if args.interval else DAEMON_SYNC_INTERVAL
+    daemon(interval=interval)
+
+class DaemonStream:
+    # Stands in for stdout or stderr of a forwarded command. Writes are
+    # relayed to the client right away.
+    def __init__(self, conn, kind):
+        self.conn = conn
+        self.kind = kind
+
+    def write(self, text):
+        if text:
+            send_message(self.conn, {self.kind: text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+def send_message(conn, message):
+    conn.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+def daemon_connect():
+    import socket
+
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(DAEMON_CONNECT_TIMEOUT)
+    try:
+        sock.connect(DAEMON_SOCKET)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+def should_forward(args):
+    if os.getenv('OJCLI_NO_DAEMON') or args.page or args.profile:
+        return False
+    if args.cmd not in DAEMON_COMMANDS:
+        return False
+    return not (getattr(args, 'watch', False) or getattr(args, 'users', None))
+
+def forward_to_daemon(argv):
+    sock = daemon_connect()
+    if sock is None:
+        return None
+    with sock, sock.makefile('rb') as replies:
+        try:
+            send_message(sock, {'argv': argv, 'cwd': os.getcwd()})
+            # A busy, stopped or wedged daemon does not take the command in
+            # time, and it runs in process instead
+            if json.loads(replies.readline() or 'null') != {'accepted': True}:
+                return None
+        except (OSError, ValueError):
+            return None
+        sock.settimeout(None)
+        try:
+            for line in replies:
+                message = json.loads(line)
+                if 'out' in message:
+                    sys.stdout.write(message['out'])
+                    sys.stdout.flush()
+                elif 'err' in message:
+                    sys.stderr.write(message['err'])
+                    sys.stderr.flush()
+                elif 'exit' in message:
+                    return message['exit']
+        except BrokenPipeError:
+            # Our own stdout was closed early, e.g. when piped into head
+            return 0
+        except (ConnectionError, ValueError):
+            pass
+    print('Lost connection to the daemon!')
+    return 1
+
+def notify_daemon_submitted():
+    # submit runs locally, so a running daemon is told to sync before it
+    # serves the history again. Without a daemon there is nothing to do.
+    sock = daemon_connect()
+    if sock is None:
+        return
+    with sock, sock.makefile('rb') as replies:
+        try:
+            send_message(sock, {'control': 'submitted'})
+            replies.readline()
+        except OSError:
+            pass
+
+def stop_daemon():
+    sock = daemon_connect()
+    if sock is None:
+        print('No daemon is running.')
+        sys.exit(1)
+    with sock, sock.makefile('rb') as replies:
+        try:
+            send_message(sock, {'control': 'stop'})
+            replies.readline()
+        except OSError:
+            print('The daemon did not respond.')
+            sys.exit(1)
+    print('Daemon stopped.')
+
+def config_stamp():
+    return [os.path.getmtime(p) for p in config_paths() if os.path.exists(p)]
+
+def reload_changed_config():
     global CFG
+    global USER_ID
+    global SESSION
+    global LAST_SYNC
+    global DAEMON_CONFIG_STAMP
+
+    stamp = config_stamp()
+    if stamp != DAEMON_CONFIG_STAMP:
+        CFG = USER_ID = SESSION = LAST_SYNC = None
+        DAEMON_CONFIG_STAMP = stamp
+
+def run_forwarded(request, conn):
+    global PROBLEM_DATA
+    import io
+
+    # Forwarded commands never wait on the client, a prompt reads end of
+    # input and is declined
+    saved = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin = io.StringIO()
+    sys.stdout = DaemonStream(conn, 'out')
+    sys.stderr = DaemonStream(conn, 'err')
+    try:
+        os.chdir(request['cwd'])
+        reload_changed_config()
+        args = build_parser().parse_args(request['argv'])
+        if args.refresh_catalog:
+            PROBLEM_DATA = None
+        run_command(args)
+        return 0
+    except SystemExit as exc:
+        if exc.code is None or isinstance(exc.code, int):
+            return exc.code or 0
+        print(exc.code, file=sys.stderr)
+        return 1
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved
+
+def serve_daemon_client(conn, lock):
+    with conn.makefile('rb') as replies:
+        request = json.loads(replies.readline() or 'null')
+        if not isinstance(request, dict):
+            return False
+        if request.get('control') == 'stop':
+            send_message(conn, {'exit': 0})
+            return True
+        if request.get('control') == 'submitted':
+            # Taken under the lock, so a sync that started before the
+            # upload cannot mark the history fresh afterwards
+            with lock:
+                mark_submitted()
+            send_message(conn, {'exit': 0})
+            return False
+        # Commands share the module state, so they run one at a time
+        with lock:
+            send_message(conn, {'accepted': True})
+            status = run_forwarded(request, conn)
+        send_message(conn, {'exit': status})
+    return False
+
+def mark_submitted():
+    global LAST_SYNC
+    global DAEMON_SUBMITTED
+
+    LAST_SYNC = None
+    DAEMON_SUBMITTED = time.monotonic()
+
+def daemon_sync_loop(lock, interval, stop):
+    global PROBLEM_DATA
+
+    catalog_loaded = time.monotonic()
+    while not stop.wait(DAEMON_PENDING_INTERVAL):
+        with lock:
+            try:
+                reload_changed_config()
+                # Submissions in the judge queue are followed closely, the
+                # rest of the history only every interval seconds
+                pending = has_pending_submissions(load_userid()) or (
+                    DAEMON_SUBMITTED is not None
+                    and time.monotonic() - DAEMON_SUBMITTED < DAEMON_SUBMIT_WINDOW)
+                sync_own_submissions(max_age=DAEMON_PENDING_INTERVAL if pending else interval)
+                if time.monotonic() - catalog_loaded >= CATALOG_TTL:
+                    PROBLEM_DATA = None
+                    load_catalog()
+                    catalog_loaded = time.monotonic()
+            except Exception as exc:
+                print('Background sync failed:', exc, file=sys.stderr)
+
+def daemon(interval=DAEMON_SYNC_INTERVAL):
+    global SYNC_MAX_AGE
+    import signal
+    import socket
+
+    sock = daemon_connect()
+    if sock is not None:
+        sock.close()
+        print(f'A daemon is already listening on {DAEMON_SOCKET}')
+        sys.exit(1)
+
+    reload_changed_config()
+    prefetch({'catalog', 'userid'})
+    sync_own_submissions()
+    SYNC_MAX_AGE = interval
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        os.remove(DAEMON_SOCKET)
+    except OSError:
+        pass
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # The socket serves the user's submission history, so only the owner
+    # may connect
+    umask = os.umask(0o177)
+    try:
+        listener.bind(DAEMON_SOCKET)
+    finally:
+        os.umask(umask)
+    listener.listen()
+    # SIGTERM is turned into KeyboardInterrupt, which forwarded commands do
+    # not catch, so the socket file is always cleaned up
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    lock = threading.Lock()
+    stop = threading.Event()
+    threading.Thread(target=daemon_sync_loop, args=(lock, interval, stop), daemon=True).start()
+    print(f'Listening on {DAEMON_SOCKET}')
+    try:
+        while True:
+            conn, _ = listener.accept()
+            with conn:
+                try:
+                    if serve_daemon_client(conn, lock):
+                        break
+                except (OSError, ValueError) as exc:
+                    print('Client failed:', exc, file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        listener.close()
+        try:
+            os.remove(DAEMON_SOCKET)
+        except OSError:
+            pass
+# ------------------------------------------------------------------------
+
 
-    PROBLEM_DATA = get_problem_data()
-    create_problem_lookups()
 
+# ------------------------------------------------------------------------
+# Main method
+# ------------------------------------------------------------------------
+def build_parser():
     parser = argparse.ArgumentParser(description='Perform Online Judge actions from the command line')
+    parser.add_argument('--refresh-catalog', action='store_true',
+        help="Refresh the cached problem catalog before running the command")
+    parser.add_argument('--page', action='store_true',
+        help="Show long tables through $PAGER")
+    parser.add_argument('--profile', action='store_true',
+        help="Report phase timings and HTTP requests on stderr")
+    parser.add_argument('--profile-format', choices=['text', 'json'], default='text',
+        help="Format of the --profile report. Default is text.")
+    parser.add_argument('--format', choices=['table', 'json', 'ndjson', 'csv'], default='table',
+        help="Output format of verdict, rank, progress and stats. Default is table.")
     subparsers = parser.add_subparsers(dest="cmd", description="Recognized commands", required=True)
 
     # sumbit sub-comand options
@@ -863,7 +3083,17 @@ def main():
         help="Specify problem (overrides problem best guess)")
     submit_parser.add_argument('-l', '--language',
         help="Specify programming language (overrides language best guess)")
-    submit_parser.add_argument('files', nargs='+')
+    submit_parser.add_argument('-w', '--wait', action='store_true',
+        help="Wait for the verdict and exit with status 0 only if accepted")
+    submit_parser.add_argument('-b', '--batch', metavar='DIR',
+        help="Submit every solution in DIR, guessing problems and languages from filenames")
+    submit_parser.add_argument('-r', '--rate-limit', type=float, metavar='SECONDS',
+        help="Seconds to wait between batch uploads (overrides the submit.rate_limit config)")
+    submit_parser.add_argument('-c', '--check', action='store_true',
+        help="Compile and run the solution against local sample tests first, submit only if all pass")
+    submit_parser.add_argument('--samples', metavar='DIR',
+        help="Directory with <problem>*.in/.out sample pairs. Default is the solution's directory.")
+    submit_parser.add_argument('files', nargs='*')
     submit_parser.set_defaults(func=submit_a)
 
     # verdict sub-comand options
@@ -875,6 +3105,8 @@ def main():
         help="Limits number of returned verdicts. Default is 25 verdicts.")
     verdict_exclusive.add_argument('-a', '--all', action='store_true',
         help="Returns all verdicts or all verdicts for problem if specified.")
+    verdict_exclusive.add_argument('-w', '--watch', action='store_true',
+        help="Wait until the latest submission is judged and exit with status 0 only if accepted.")
     verdict_parser.set_defaults(func=verdict_a)
 
     # rank sub-comand options
@@ -887,18 +3119,35 @@ def main():
         help="Return usernames and ranks of N users above and below your rank.")
     rank_parser.add_argument('-n', '--next', type=int,
         help="Show how many more accepted problems needed to ascend N ranks.")
+    rank_parser.add_argument('-s', '--since', type=parse_since, metavar='DATE',
+        help="Show rank and AC changes since DATE (YYYY-MM-DD or e.g. 7d) from stored snapshots.")
     rank_parser.set_defaults(func=rank_a)
 
     # random sub-comand options
     random_parser = subparsers.add_parser("random", help="Get a random problem to solve")
     random_parser.add_argument('-v', '--volume', type=int,
         help="Restrict random choice to specific problem volume")
+    random_parser.add_argument('-u', '--unsolved', action='store_true',
+        help="Only pick problems you have not solved yet")
     random_parser.set_defaults(func=random_prb_a)
 
+    # open sub-comand options
+    open_parser = subparsers.add_parser("open", aliases=["show"], help="Open a problem statement from the local cache")
+    open_parser.add_argument('problem', type=int, nargs='?')
+    open_parser.add_argument('-v', '--volume', type=int,
+        help="Volume to prefetch from. Default is the volume of the problem.")
+    open_parser.add_argument('-P', '--prefetch', type=int, metavar='N',
+        help="Also download the statements of the next N unsolved problems in the volume")
+    open_parser.add_argument('-n', '--no-browser', action='store_true',
+        help="Print the path of the cached statement instead of opening it")
+    open_parser.set_defaults(func=open_a)
+
     # progress sub-comand options
     progress_parser = subparsers.add_parser("progress", help="Show problem set progress")
     progress_parser.add_argument('-v', '--volume', type=int,
         help="Restrict progress to specific problem volume")
+    progress_parser.add_argument('-U', '--users', metavar='FILE',
+        help="Show a leaderboard and combined progress for the usernames listed in FILE")
     progress_parser.set_defaults(func=progress_a)
 
     # stats sub-comand options
@@ -907,19 +3156,81 @@ def main():
         help='Only show statistics on submissions')
     stats_parser.add_argument('-l', '--languages', action='store_true',
         help='Only show statistics on languages')
+    stats_parser.add_argument('-m', '--months', action='store_true',
+        help='Show submission volume per month')
+    stats_parser.add_argument('-V', '--volumes', action='store_true',
+        help='Show accepted ratio per problem volume')
+    stats_parser.add_argument('-r', '--runtimes', action='store_true',
+        help='Show runtime percentiles of accepted submissions')
+    stats_parser.add_argument('-U', '--users', metavar='FILE',
+        help='Show a leaderboard and combined statistics for the usernames listed in FILE')
     stats_parser.set_defaults(func=stats_a)
 
-    args = parser.parse_args()
+    # search sub-comand options
+    search_parser = subparsers.add_parser("search", help="Search problem titles")
+    search_parser.add_argument('-n', '--limit', type=int,
+        help="Maximum number of matches to show. Default is 10 matches.")
+    search_parser.add_argument('query', nargs='+')
+    search_parser.set_defaults(func=search_a)
+
+    # watch sub-comand options
+    watch_parser = subparsers.add_parser("watch", help="Live dashboard of verdicts, rank and progress")
+    watch_parser.add_argument('-i', '--interval', type=float, metavar='SECONDS',
+        help=f"Longest time between polls while nothing changes. Default is {DASHBOARD_IDLE_INTERVAL} seconds.")
+    watch_parser.add_argument('-l', '--limit', type=int,
+        help=f"Number of latest verdicts to show. Default is {DASHBOARD_VERDICTS}.")
+    watch_parser.add_argument('-C', '--surround', type=int,
+        help=f"Number of users above and below your rank to show. Default is {DASHBOARD_SURROUND}.")
+    watch_parser.set_defaults(func=watch_a)
+
+    # daemon sub-comand options
+    daemon_parser = subparsers.add_parser("daemon", help="Keep caches warm and serve commands over a socket")
+    daemon_parser.add_argument('-i', '--interval', type=float, metavar='SECONDS',
+        help=f"Seconds between background submission syncs. Default is {DAEMON_SYNC_INTERVAL} seconds.")
+    daemon_parser.add_argument('--stop', action='store_true',
+        help="Stop the running daemon")
+    daemon_parser.set_defaults(func=daemon_a)
+
+    return parser
+
+def run_command(args):
+    global REFRESH_CATALOG
+    global PAGE_OUTPUT
+    global OUTPUT_FORMAT
+
+    REFRESH_CATALOG = args.refresh_catalog
+    PAGE_OUTPUT = args.page
+    OUTPUT_FORMAT = args.format
+    if args.profile:
+        start_profile()
 
     try:
-        CFG = get_config()
-    except ConfigError as exc:
+        if args.func.resources & {'userid', 'session'}:
+            with profile_phase('config'):
+                load_config()
+        with profile_phase('prefetch'):
+            prefetch(args.func.resources)
+        with profile_phase('command'):
+            args.func(args)
+    except (ConfigError, StaleUserIdError, StatementError) as exc:
         print(exc)
         sys.exit(1)
+    except Exception as err:
+        if not is_request_error(err):
+            raise
+        print('Connection failed:', err)
+        sys.exit(1)
+    finally:
+        if args.profile:
+            report_profile(args.profile_format)
 
-    USER_ID = get_userid(CFG.get('user', 'username'))
-
-    args.func(args)
+def main():
+    args = build_parser().parse_args()
+    if should_forward(args):
+        status = forward_to_daemon(sys.argv[1:])
+        if status is not None:
+            sys.exit(status)
+    run_command(args)
 
 if __name__ == "__main__":
     main()